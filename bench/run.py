@@ -0,0 +1,148 @@
+# encoding=utf-8
+"""
+This module runs the throughput benchmarks of the generated readers and
+saves the results as JSON, so runs can be compared.
+
+Usage:
+    $ python -m bench.run [--sizes 1MB,10MB] [--scenarios simple,systemd]
+                          [--stages readall,iter,next_line] [--output FILE]
+    $ python -m bench.run --compare OLD.json NEW.json
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+from reader.generate import VERSION, load_reader
+
+from . import synthetic
+
+DEFAULT_SIZES = '1MB,10MB,100MB'
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def stage_readall(reader) -> int:
+    return len(reader.readall())
+
+
+def stage_iter(reader) -> int:
+    count = 0
+    for _ in reader:
+        count += 1
+    return count
+
+
+def stage_next_line(reader) -> int:
+    count = 0
+    while True:
+        try:
+            reader.next_line()
+        except StopIteration:
+            return count
+        count += 1
+
+
+STAGES = {
+    'readall': stage_readall,
+    'iter': stage_iter,
+    'next_line': stage_next_line,
+}
+
+
+def measure(scenario: str, path: str, stage: str) -> dict:
+    """
+    Run one stage over the file. Called in a fresh process, so the peak RSS
+    is the stage's own.
+    """
+    logsys, pattern, _ = synthetic.SCENARIOS[scenario]
+    reader = load_reader(logsys, pattern)(path)
+    start = time.perf_counter()
+    records = STAGES[stage](reader)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return {
+        'scenario': scenario, 'stage': stage, 'bytes': os.path.getsize(path),
+        'records': records, 'seconds': seconds,
+        'records_per_s': records / seconds if seconds else None,
+        'mb_per_s': os.path.getsize(path) / (1 << 20) / seconds
+        if seconds else None,
+        'peak_rss_kb': peak,
+    }
+
+
+def run(scenarios: list, sizes: list, stages: list, root: str,
+        seed: int=0) -> dict:
+    results = []
+    for scenario in scenarios:
+        for size in sizes:
+            path = synthetic.ensure(scenario, size, root, seed)
+            for stage in stages:
+                with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+                    result = pool.apply(measure, (scenario, path, stage))
+                result['size'] = size
+                results.append(result)
+                print('{scenario:>12} {size:>12} {stage:>10} '
+                      '{records:>10} records {seconds:8.3f}s '
+                      '{records_per_s:12.0f} rec/s {peak_rss_kb:>9} KiB'
+                      .format(**result))
+    return {
+        'meta': {
+            'logpie': VERSION, 'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'seed': seed,
+            'time': datetime.datetime.now().isoformat(),
+        },
+        'results': results,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    """
+    Print the records/s and peak RSS ratios of two saved runs.
+    """
+    def load(path):
+        with open(path) as result_file:
+            return {(r['scenario'], r['size'], r['stage']): r
+                    for r in json.load(result_file)['results']}
+
+    old, new = load(old_path), load(new_path)
+    for key in sorted(set(old) & set(new)):
+        speedup = new[key]['records_per_s'] / old[key]['records_per_s']
+        memory = new[key]['peak_rss_kb'] / old[key]['peak_rss_kb']
+        print('{:>12} {:>12} {:>10}  speed x{:.2f}  peak rss x{:.2f}'
+              .format(*key, speedup, memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LogPie readers.')
+    parser.add_argument('--scenarios', default=','.join(synthetic.SCENARIOS))
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='comma separated, like 1MB,10MB,10GB')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--root', default=DEFAULT_ROOT,
+                        help='where the synthetic files are kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args.scenarios.split(','),
+                 [synthetic.parse_size(size) for size in args.sizes.split(',')],
+                 args.stages.split(','), args.root, args.seed)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
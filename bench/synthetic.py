@@ -0,0 +1,140 @@
+# encoding=utf-8
+"""
+This module writes deterministic synthetic log files for the benchmarks.
+Each scenario pairs a logsys and pattern with a generator of records in
+that format; the same seed always writes the same file.
+"""
+
+import datetime
+import os
+import random
+
+from reader.pattern.log4j import SIMPLE_CONVERSION_PATTERN
+from reader.pattern.log4j import TTCC_CONVERSION_PATTERN
+
+START = datetime.datetime(2014, 1, 2, 3, 4, 5)
+LEVELS = ('DEBUG', 'INFO', 'INFO', 'INFO', 'WARN', 'ERROR', 'FATAL')
+THREADS = ('main', 'worker_1', 'worker_2', 'scheduler', 'io_pool_7')
+LOGGERS = ('com.example.app.Server', 'com.example.db.Pool',
+           'com.example.http.Handler', 'org.apache.zookeeper.ClientCnxn')
+HOSTS = ('arch', 'node01', 'node02', 'gateway')
+SOURCES = ('kernel', 'systemd[1]', 'sshd[{}]', 'cron[{}]', 'dbus-daemon[{}]')
+WORDS = ('connection', 'request', 'timeout', 'session', 'retry', 'closed',
+         'opened', 'user', 'failed', 'completed', 'queue', 'flushed', 'cache')
+FRAMES = ('com.example.app.Server.handle', 'com.example.db.Pool.acquire',
+          'java.util.concurrent.ThreadPoolExecutor.runWorker',
+          'java.lang.Thread.run')
+
+
+def message(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+
+
+def stack_trace(rng: random.Random) -> str:
+    lines = ['java.lang.IllegalStateException: {}\n'.format(message(rng))]
+    for _ in range(rng.randint(5, 30)):
+        lines.append('\tat {}(Server.java:{})\n'.format(
+            rng.choice(FRAMES), rng.randint(1, 999)))
+    return ''.join(lines)
+
+
+def simple_record(rng: random.Random, timestamp: datetime.datetime,
+                  runtime: int, traces: float=0.0) -> str:
+    record = '{},{:03d} [{}] {} {} - {}\n'.format(
+        timestamp.strftime('%Y-%m-%d %H:%M:%S'), timestamp.microsecond // 1000,
+        rng.choice(THREADS), rng.choice(LEVELS), rng.choice(LOGGERS),
+        message(rng))
+    if traces and rng.random() < traces:
+        record += stack_trace(rng)
+    return record
+
+
+def ttcc_record(rng: random.Random, timestamp: datetime.datetime,
+                runtime: int) -> str:
+    ndc = rng.choice(('', '', 'req_42', 'req_42 user_7'))
+    return '{} [{}] {} {} {} - {}\n'.format(
+        runtime, rng.choice(THREADS), rng.choice(LEVELS),
+        rng.choice(LOGGERS), ndc, message(rng))
+
+
+def custom_date_record(rng: random.Random, timestamp: datetime.datetime,
+                       runtime: int) -> str:
+    return '{},{:03d} {} {} - {}\n'.format(
+        timestamp.strftime('%Y/%m/%d %H:%M:%S'), timestamp.microsecond // 1000,
+        rng.choice(LEVELS), rng.choice(LOGGERS), message(rng))
+
+
+def systemd_record(rng: random.Random, timestamp: datetime.datetime,
+                   runtime: int) -> str:
+    return '{} {} {}: {}\n'.format(
+        timestamp.strftime('%b %d %H:%M:%S'), rng.choice(HOSTS),
+        rng.choice(SOURCES).format(rng.randint(2, 65535)), message(rng))
+
+
+def stack_trace_record(rng: random.Random, timestamp: datetime.datetime,
+                       runtime: int) -> str:
+    return simple_record(rng, timestamp, runtime, traces=0.2)
+
+
+# name -> (logsys, pattern, record generator)
+SCENARIOS = {
+    'simple': ('log4j', SIMPLE_CONVERSION_PATTERN, simple_record),
+    'ttcc': ('log4j', TTCC_CONVERSION_PATTERN, ttcc_record),
+    'custom-date': ('log4j', '%d{yyyy/MM/dd HH:mm:ss,SSS} %p %c - %m%n',
+                    custom_date_record),
+    'systemd': ('systemd', '%d %h %s: %m', systemd_record),
+    'stack-trace': ('log4j', SIMPLE_CONVERSION_PATTERN, stack_trace_record),
+}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size like '1MB', '512KB' or '10GB' into bytes.
+    """
+    units = {'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+    size = size.strip().upper()
+    for unit, factor in units.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+
+def generate(scenario: str, size: int, path: str, seed: int=0) -> int:
+    """
+    Write at least `size` bytes of records of `scenario` to `path`.
+    :return: the number of records written
+    """
+    logsys, pattern, make_record = SCENARIOS[scenario]
+    rng = random.Random(seed)
+    timestamp = START
+    runtime = 0
+    written = 0
+    records = 0
+    buffered = []
+    with open(path, 'w') as log_file:
+        while written < size:
+            step = rng.randint(0, 250)
+            timestamp += datetime.timedelta(milliseconds=step)
+            runtime += step
+            record = make_record(rng, timestamp, runtime)
+            buffered.append(record)
+            written += len(record)
+            records += 1
+            if len(buffered) >= 4096:
+                log_file.writelines(buffered)
+                buffered.clear()
+        log_file.writelines(buffered)
+    return records
+
+
+def ensure(scenario: str, size: int, root: str, seed: int=0) -> str:
+    """
+    Returns the path of the synthetic file, generating it if missing.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, '{}_{}_{}.log'.format(scenario, size, seed))
+    if not os.path.exists(path):
+        temp_path = path + '.tmp'
+        generate(scenario, size, temp_path, seed)
+        os.replace(temp_path, path)
+    return path
@@ -3,15 +3,10 @@
 The main interface of LogPie
 """
 
-import os
 import json
 import logging
-import subprocess
-import sys
 
-import reader.gen
-
-from reader.generate import make_reader
+from reader.generate import load_reader
 
 CONFIGURATION = 'logpie.json'
 DEFAULT_CONFIG = {
@@ -51,14 +46,10 @@ def main():
     logger.info("BUILDING READER")
     logsys = configure['logsys']
     pattern = configure['pattern']
-    path = make_reader(logsys, pattern)
-    runnable = configure['python-runnable']
+    reader_cls = load_reader(logsys, pattern)
     logfile = configure['logfile']
     # use reader
-    gen_folder, gen_name = os.path.split(path)
-    sys.path.append(gen_folder)
-    gen_module = __import__(gen_name[:-3])
-    val = gen_module.main(logfile)
+    val = reader_cls(logfile).readall()
     print(len(val))
     # further not implemented
 
@@ -0,0 +1,200 @@
+# encoding=utf-8
+"""
+This module counts the records of a stream in time buckets, grouped by
+some of their fields, like the level or the host, and gives out each
+bucket once time has moved past it. Only the buckets still open are held,
+so the rate series of a log of any size are made in bounded memory.
+"""
+
+import datetime
+
+from .generic import GeneralReader
+from .merge import timestamp_key
+
+# the group of the records beyond max_groups in a bucket
+OTHER = '<other>'
+
+
+class Bucket(object):
+    """
+    The counts of the records within [start, end), by group.
+    A group is the tuple of the values of the group-by keys.
+    """
+    __slots__ = ('start', 'end', 'counts')
+
+    def __init__(self, start: datetime.datetime, end: datetime.datetime,
+                 counts: dict):
+        self.start = start
+        self.end = end
+        self.counts = counts
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def as_dict(self) -> dict:
+        return {'start': self.start, 'end': self.end,
+                'counts': dict(self.counts)}
+
+    def __eq__(self, other):
+        if not isinstance(other, Bucket):
+            return NotImplemented
+        return (self.start, self.end, self.counts) == \
+            (other.start, other.end, other.counts)
+
+    def __repr__(self):
+        return 'Bucket({}, {}, {!r})'.format(self.start, self.end,
+                                             self.counts)
+
+
+def make_getter(record, key: str) -> callable:
+    """
+    Returns a function reading `key` from records like `record`.
+    A key which is not a field, like 'source.pname', reads into the value
+    of the longest field it starts with, like record['source']['pname'].
+    """
+    if key in record:
+        return lambda record: record[key]
+    parts = key.split('.')
+    for cut in range(len(parts) - 1, 0, -1):
+        field = '.'.join(parts[:cut])
+        if field in record:
+            path = parts[cut:]
+
+            def get(record):
+                value = record[field]
+                for part in path:
+                    value = value[part]
+                return value
+
+            return get
+    raise KeyError(key)
+
+
+class Aggregator(object):
+    """
+    Count records into buckets of `width` by the values of `keys`.
+    Feed it records in about timestamp order with add(), which returns the
+    buckets time has moved past, and call flush() at the end.
+    """
+
+    def __init__(self, keys, width: datetime.timedelta, timestamp: str,
+                 lateness: datetime.timedelta=None, max_groups: int=None):
+        """
+        :param keys: the group-by keys, like ('level', 'source.pname')
+        :param width: the time span of a bucket
+        :param timestamp: the key of the records' timestamp
+        :param lateness: how long a bucket is kept open after its end for
+        records out of order; records later than that are counted in
+        self.late and dropped
+        :param max_groups: the groups a bucket counts at most, the records
+        of further groups are counted in the group of OTHER
+        """
+        self.keys = tuple(keys)
+        self.width = width
+        self.timestamp = timestamp
+        self.lateness = lateness or datetime.timedelta(0)
+        self.max_groups = max_groups
+        # start -> counts of the open buckets
+        self.buckets = dict()
+        # the latest timestamp seen
+        self.watermark = None
+        # the end of the buckets given out, earlier records are late
+        self.closed = None
+        # when the oldest open bucket is due
+        self.due = None
+        self.late = 0
+        self.getters = None
+        self.other = (OTHER,) * len(self.keys)
+
+    def _start(self, timestamp: datetime.datetime) -> datetime.datetime:
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=timestamp.tzinfo)
+        return timestamp - (timestamp - epoch) % self.width
+
+    def add(self, record) -> list:
+        """
+        Count a record, and returns the buckets finished since.
+        """
+        if self.getters is None:
+            self.getters = [make_getter(record, key) for key in self.keys]
+        timestamp = record[self.timestamp]
+        start = self._start(timestamp)
+        counts = self.buckets.get(start)
+        if counts is None:
+            if self.closed is not None and start < self.closed:
+                self.late += 1
+                return []
+            counts = self.buckets[start] = dict()
+            due = start + self.width + self.lateness
+            if self.due is None or due < self.due:
+                self.due = due
+        group = tuple(getter(record) for getter in self.getters)
+        if group in counts:
+            counts[group] += 1
+        elif self.max_groups is not None and \
+                len(counts) >= self.max_groups:
+            counts[self.other] = counts.get(self.other, 0) + 1
+        else:
+            counts[group] = 1
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+            if timestamp >= self.due:
+                return self._finish(timestamp - self.lateness)
+        return []
+
+    def _finish(self, until: datetime.datetime) -> list:
+        """
+        Give out the buckets ending at or before `until`, oldest first.
+        """
+        finished = []
+        for start in sorted(self.buckets):
+            end = start + self.width
+            if end > until:
+                self.due = end + self.lateness
+                break
+            finished.append(Bucket(start, end, self.buckets.pop(start)))
+            self.closed = end
+        else:
+            self.due = None
+        return finished
+
+    def flush(self) -> list:
+        """
+        Give out all the open buckets, oldest first.
+        """
+        finished = [Bucket(start, start + self.width, self.buckets[start])
+                    for start in sorted(self.buckets)]
+        if finished:
+            self.closed = finished[-1].end
+        self.buckets.clear()
+        self.due = None
+        return finished
+
+
+def aggregate(records, keys, width: datetime.timedelta,
+              timestamp: str=None, lateness: datetime.timedelta=None,
+              max_groups: int=None, batch_size: int=4096):
+    """
+    Yield the Buckets of an Aggregator over `records` as they finish.
+    A reader is read in batches, project it to the group-by and timestamp
+    keys to skip building the other fields.
+    :param records: a reader, or any iterable of records
+    :param timestamp: the key of the records' timestamp, defaults to the
+    reader's first timestamp
+    See Aggregator for the other params.
+    """
+    if timestamp is None:
+        if not isinstance(records, GeneralReader):
+            raise ValueError('Give the timestamp key of the records.')
+        timestamp = timestamp_key(records)
+    aggregator = Aggregator(keys, width, timestamp, lateness, max_groups)
+    if isinstance(records, GeneralReader):
+        batches = records.read_batches(batch_size)
+    else:
+        batches = [records]
+    add = aggregator.add
+    for batch in batches:
+        for record in batch:
+            finished = add(record)
+            if finished:
+                yield from finished
+    yield from aggregator.flush()
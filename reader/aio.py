@@ -0,0 +1,85 @@
+# encoding=utf-8
+"""
+This module gives out an asyncio counterpart of the general reader, which
+reads records from an asyncio.StreamReader, like a UNIX socket, the pipe
+of `journalctl -f` or a TCP syslog connection.
+"""
+
+import asyncio
+import locale
+
+
+class AsyncReader(object):
+    """
+    Read the records of a stream with the regexp and triads of a reader.
+    Use it as `async for record in AsyncReader(reader, stream)`, or
+    `await AsyncReader(reader, stream).readall()`.
+    """
+
+    def __init__(self, reader, stream: asyncio.StreamReader,
+                 flush_after: float=None):
+        """
+        :param reader: a GeneralReader, e.g. a generated one made over an
+        empty list, giving the regexp, triads and filters
+        :param stream: the stream to read lines from
+        :param flush_after: yield the pending record after this many seconds
+        without a new line, None to keep it until the next head or EOF
+        """
+        self.reader = reader
+        self.stream = stream
+        self.flush_after = flush_after
+        self.encoding = reader.encoding or locale.getpreferredencoding(False)
+
+    async def _readline(self) -> bytes:
+        """
+        Returns the next line, b'' at EOF, or None if no line came within
+        flush_after seconds.
+        """
+        if self.flush_after is None:
+            return await self.stream.readline()
+        try:
+            return await asyncio.wait_for(self.stream.readline(),
+                                          self.flush_after)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _iter_records(self):
+        """
+        Group lines into records like GeneralReader._iter_records does.
+        """
+        assembler = self.reader._assembler()
+        while True:
+            raw = await self._readline()
+            if raw is None:
+                record = assembler.flush()
+            elif not raw:
+                break
+            else:
+                record = assembler.feed(raw.decode(self.encoding))
+            if record is not None:
+                yield record
+        record = assembler.flush()
+        if record is not None:
+            yield record
+
+    async def _records(self):
+        """
+        Match, filter and build each record, like GeneralReader does.
+        """
+        reader = self.reader
+        match_record = reader._record_matcher(reader._stamper(), '<STREAM>')
+        lineno = 0
+        async for record in self._iter_records():
+            lineno += 1
+            segments = match_record(record, lineno)
+            if segments is not None:
+                yield reader.build_segments(segments)
+
+    def __aiter__(self):
+        return self._records()
+
+    async def readall(self) -> list:
+        """
+        Read the stream until EOF and returns all the records.
+        """
+        return [log_item async for log_item in self]
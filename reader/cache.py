@@ -0,0 +1,295 @@
+# encoding=utf-8
+"""
+This module keeps the parsed records of a log file in a compact binary
+columnar file beside it, so reading the unchanged file again loads the
+records instead of matching and building them, and reading an appended
+file only parses the new tail.
+"""
+
+import array
+import datetime
+import hashlib
+import json
+import locale
+import os
+import re
+import struct
+import sys
+import zlib
+
+CACHE_SUFFIX = '.lpcache'
+CACHE_VERSION = 1
+MAGIC = b'LPRC'
+# bytes at the beginning of the file and before the cached end, at most,
+# hashed to tell an appended file from a changed one
+HEAD_SIZE = 1024
+TAIL_SIZE = 1024
+# bytes read at once looking backwards for the last record head
+SCAN_SIZE = 1 << 16
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class ResultCache(object):
+    """
+    The built records of a log file up to its last record head, saved as
+    one compressed column per triad.
+    The last record is never cached, since more continuation lines may be
+    appended to it, and is parsed on each read.
+    """
+
+    def __init__(self, path: str, digest: str, cache_path: str=None):
+        """
+        :param path: the path of the log file
+        :param digest: the pattern digest of the reader, see
+        GeneralReader.pattern_digest
+        :param cache_path: where to keep the cache, defaults to the log
+        file's path plus CACHE_SUFFIX
+        """
+        self.path = path
+        self.cache_path = cache_path or path + CACHE_SUFFIX
+        self.digest = digest
+        self.size = 0
+        self.mtime = 0
+        self.head = None
+        self.tail = None
+        # offset of the last record head, the records before it are cached
+        self.end = 0
+        # the built values of the cached records, one list per triad
+        self.columns = None
+
+    def _digest(self, start: int, length: int) -> str:
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(start)
+            return hashlib.sha1(log_file.read(length)).hexdigest()
+
+    def _tail_digest(self, end: int) -> str:
+        start = max(end - TAIL_SIZE, 0)
+        return self._digest(start, end - start)
+
+    def load(self, keys: list):
+        """
+        Load the saved cache, unless it is missing, broken or made for
+        another pattern.
+        :param keys: the triad keys of the reader, in order
+        """
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                data = cache_file.read()
+        except IOError:
+            return
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                return
+            start = len(MAGIC) + 4
+            header_size, = struct.unpack('<I', data[len(MAGIC):start])
+            header = json.loads(data[start:start + header_size]
+                                .decode('utf-8'))
+            if header.get('version') != CACHE_VERSION or \
+                    header.get('digest') != self.digest or \
+                    [column['key'] for column in header['columns']] != keys:
+                return
+            offset = start + header_size
+            columns = []
+            for column in header['columns']:
+                parts = []
+                for size in column['parts']:
+                    parts.append(zlib.decompress(data[offset:offset + size]))
+                    offset += size
+                columns.append(decode_column(column, parts, header['count'],
+                                             header['byteorder']))
+        except (ValueError, KeyError, struct.error, zlib.error):
+            return
+        self.size = header['size']
+        self.mtime = header['mtime']
+        self.head = header['head']
+        self.tail = header['tail']
+        self.end = header['end']
+        self.columns = columns
+
+    def save(self, reader, kinds: list):
+        """
+        Save the cache, replacing the old one at once.
+        Returns False if a column cannot be encoded, leaving no cache.
+        """
+        header_columns = []
+        blobs = []
+        count = len(self.columns[0]) if self.columns else 0
+        for (key, cls, addition), kind, column in zip(reader.triads, kinds,
+                                                      self.columns):
+            try:
+                kind, parts = encode_column(kind, column)
+            except (TypeError, ValueError, OverflowError):
+                return False
+            parts = [zlib.compress(part, 1) for part in parts]
+            header_columns.append({'key': key, 'kind': kind,
+                                   'parts': [len(part) for part in parts]})
+            blobs.extend(parts)
+        header = json.dumps({
+            'version': CACHE_VERSION, 'digest': self.digest,
+            'size': self.size, 'mtime': self.mtime, 'head': self.head,
+            'tail': self.tail, 'end': self.end, 'count': count,
+            'byteorder': sys.byteorder,
+            'columns': header_columns}).encode('utf-8')
+        temp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+        with open(temp_path, 'wb') as cache_file:
+            cache_file.write(MAGIC)
+            cache_file.write(struct.pack('<I', len(header)))
+            cache_file.write(header)
+            for blob in blobs:
+                cache_file.write(blob)
+        os.replace(temp_path, self.cache_path)
+        return True
+
+    def _last_head(self, reader, start: int, size: int) -> int:
+        """
+        Returns the offset of the last record head in [start, size), or
+        `start` if there is none.
+        """
+        match = re.compile(reader.head_regexp or reader.regexp).match
+        encoding = reader.encoding or locale.getpreferredencoding(False)
+        scan = SCAN_SIZE
+        with open(self.path, 'rb') as log_file:
+            while True:
+                low = max(size - scan, start)
+                log_file.seek(low)
+                data = log_file.read(size - low)
+                lines = data.split(b'\n')
+                offsets = [low]
+                for line in lines[:-1]:
+                    offsets.append(offsets[-1] + len(line) + 1)
+                # the first piece may be the end of a line started before
+                first = 0 if low == start else 1
+                for index in range(len(lines) - 1, first - 1, -1):
+                    if offsets[index] >= size:
+                        continue
+                    line = lines[index].decode(encoding, 'replace')
+                    if match(line):
+                        return offsets[index]
+                if low == start:
+                    return start
+                scan *= 4
+
+    def read(self, reader) -> list:
+        """
+        Returns all the log items of the file, parsing only what the cache
+        does not hold, and save the cache.
+        """
+        if reader.builders is None:
+            reader._init_builders()
+        keys = [key for key, _, _ in reader.triads]
+        kinds = [column_kind(cls) for _, cls, _ in reader.triads]
+        self.load(keys)
+        stat = os.stat(self.path)
+        start = 0
+        # a stamper, like the one of a SystemdDate given a year, has to start
+        # at the first record and go on to the last one
+        stamp = reader._stamper()
+        if stamp is None and self.columns is not None and \
+                stat.st_size >= self.size and \
+                self._digest(0, min(self.end, HEAD_SIZE)) == self.head and \
+                self._tail_digest(self.end) == self.tail:
+            start = self.end
+        else:
+            self.columns = [[] for _ in keys]
+        end = self._last_head(reader, start, stat.st_size)
+        if end > start:
+            parsed = list(reader._match_records(reader._iter_records(
+                reader._range_lines(start, end)), stamp))
+            built = reader._build_columns(parsed)
+            if built:
+                for column, values in zip(self.columns, built):
+                    column.extend(values)
+        changed = end != self.end or start == 0 or \
+            stat.st_size != self.size or stat.st_mtime != self.mtime
+        self.size, self.mtime, self.end = stat.st_size, stat.st_mtime, end
+        self.head = self._digest(0, min(end, HEAD_SIZE))
+        self.tail = self._tail_digest(end)
+        if changed and self.columns:
+            self.save(reader, kinds)
+        last = list(reader._match_records(reader._iter_records(
+            reader._range_lines(end, stat.st_size)), stamp))
+        return reader._assemble(self.columns) + \
+            reader._assemble(reader._build_columns(last))
+
+
+def column_kind(cls) -> str:
+    """
+    The encoding of a directive's column, by its COLUMN_TYPE.
+    """
+    if cls.COLUMN_TYPE.startswith('datetime64'):
+        return 'datetime'
+    elif cls.COLUMN_TYPE.startswith('int'):
+        return 'int'
+    return 'object'
+
+
+def encode_column(kind: str, values: list) -> (str, list):
+    """
+    Encode a column into byte parts.
+    Datetimes and ints are packed as 64-bit integers; strings as their
+    lengths and text, with a table of the distinct values if they repeat;
+    other objects as JSON.
+    :return: the kind of encoding and the parts
+    """
+    if kind == 'datetime':
+        return kind, [array.array(
+            'q', [(value - EPOCH) // MICROSECOND for value in values])
+            .tobytes()]
+    elif kind == 'int':
+        return kind, [array.array('q', values).tobytes()]
+    if all(type(value) is str for value in values):
+        distinct = list(dict.fromkeys(values))
+        if len(distinct) * 2 <= len(values):
+            position = {value: index for index, value in enumerate(distinct)}
+            return 'table', encode_strings(distinct) + [array.array(
+                'I', map(position.__getitem__, values)).tobytes()]
+        return 'str', encode_strings(values)
+    return 'json', [json.dumps(values).encode('utf-8')]
+
+
+def encode_strings(values: list) -> list:
+    return [array.array('I', map(len, values)).tobytes(),
+            ''.join(values).encode('utf-8')]
+
+
+def decode_strings(lengths: bytes, text: bytes, byteorder: str) -> list:
+    lengths = load_array('I', lengths, byteorder)
+    text = text.decode('utf-8')
+    values = []
+    offset = 0
+    for length in lengths:
+        values.append(text[offset:offset + length])
+        offset += length
+    return values
+
+
+def load_array(typecode: str, data: bytes, byteorder: str) -> array.array:
+    values = array.array(typecode)
+    values.frombytes(data)
+    if byteorder != sys.byteorder:
+        values.byteswap()
+    return values
+
+
+def decode_column(column: dict, parts: list, count: int,
+                  byteorder: str) -> list:
+    kind = column['kind']
+    if kind == 'datetime':
+        values = [EPOCH + value * MICROSECOND
+                  for value in load_array('q', parts[0], byteorder)]
+    elif kind == 'int':
+        values = load_array('q', parts[0], byteorder).tolist()
+    elif kind == 'table':
+        distinct = decode_strings(parts[0], parts[1], byteorder)
+        values = list(map(distinct.__getitem__,
+                          load_array('I', parts[2], byteorder)))
+    elif kind == 'str':
+        values = decode_strings(parts[0], parts[1], byteorder)
+    elif kind == 'json':
+        values = json.loads(parts[0].decode('utf-8'))
+    else:
+        raise ValueError('Unknown column kind {}.'.format(kind))
+    if len(values) != count:
+        raise ValueError('Column {} is broken.'.format(column['key']))
+    return values
@@ -0,0 +1,108 @@
+# encoding=utf-8
+"""
+This module reads compressed log files, detected by their magic bytes.
+Decompression runs in a background thread feeding a bounded queue, so it
+overlaps with the matching done by the reader.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# bytes of decompressed data passed to the reader at a time
+CHUNK_SIZE = 1 << 20
+# chunks decompressed ahead of the reader at most
+BUFFERED_CHUNKS = 8
+
+# (name, magic bytes, opener) of the known formats
+FORMATS = [
+    ('gzip', b'\x1f\x8b', gzip.open),
+    ('bz2', b'BZh', bz2.open),
+    ('xz', b'\xfd7zXZ\x00', lzma.open),
+    ('zstd', b'\x28\xb5\x2f\xfd',
+     zstandard.open if zstandard is not None else None),
+]
+
+
+def detect(path: str):
+    """
+    Returns the name of the compression of the file, or None for plain text.
+    """
+    with open(path, 'rb') as log_file:
+        head = log_file.read(8)
+    for name, magic, opener in FORMATS:
+        if head.startswith(magic):
+            if opener is None:
+                raise RuntimeError('{}: reading {} requires the {} package.'
+                                   .format(path, name, 'zstandard'))
+            return name
+    return None
+
+
+def _decompress(path: str, opener, chunks: queue.Queue,
+                stop: threading.Event):
+    """
+    Put the decompressed chunks of the file, then None, into `chunks`.
+    An exception is put in place of None if decompression fails.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    try:
+        with opener(path, 'rb') as log_file:
+            while not stop.is_set():
+                chunk = log_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                put(chunk)
+    except Exception as e:
+        put(e)
+    else:
+        put(None)
+
+
+def iter_lines(path: str, compression: str, encoding: str):
+    """
+    Yield the decoded lines of a compressed file, translating line breaks
+    as open() does in text mode.
+    """
+    opener = {name: opener for name, magic, opener in FORMATS}[compression]
+    chunks = queue.Queue(BUFFERED_CHUNKS)
+    stop = threading.Event()
+    thread = threading.Thread(target=_decompress,
+                              args=(path, opener, chunks, stop),
+                              daemon=True)
+    thread.start()
+    rest = b''
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise IOError('{}: cannot decompress as {}: {}'
+                              .format(path, compression, chunk))
+            end = chunk.rfind(b'\n')
+            if end == -1:
+                rest += chunk
+                continue
+            text = (rest + chunk[:end + 1]).decode(encoding)
+            rest = chunk[end + 1:]
+            yield from io.StringIO(text, newline=None)
+        if rest:
+            yield from io.StringIO(rest.decode(encoding), newline=None)
+    finally:
+        stop.set()
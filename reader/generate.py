@@ -5,9 +5,18 @@ This module makes the reader.
 import sys
 import os
 import time
+import json
 import shutil
+import hashlib
+import importlib.util
+from .generic import record_source
 from .pattern import ROUTER as S_ROUTER
 
+# bump this when the generated code changes, it is a part of reader_digest
+VERSION = '0.5.1'
+# readers loaded by load_reader, keyed by reader_digest
+READERS = dict()
+
 READER_TPL = '''
 import sys
 
@@ -15,27 +24,40 @@ sys.path.append(\'{pie_root}\')
 
 {directive_import}
 
-from reader.generic import GeneralReader
+from reader.generic import GeneralReader, GeneralRecord
 
+{record}
 
 class {s}LogReader(GeneralReader):
-    def __init__(self, lines):
+    LOGSYS = {logsys}
+    PATTERN = {pattern}
+
+    def __init__(self, lines, keys=None):
         super().__init__(lines)
         self.regexp = {regexp}
         self.triads = {triads}
         self.triads_dict = {{key: (cls, arg) for key, cls, arg in self.triads}}
         self.using_named_capture = {unc}
+        self.split_source = {split}
+        self.head_regexp = {head}
+        self.record_cls = {s}Record
+        if keys is not None:
+            self.project(keys)
 
 
-def main(path):
+def main(path, processes=1):
     reader = {s}LogReader(path)
+    if processes > 1:
+        return reader.readall_parallel(processes)
     return reader.readall()
 
 if __name__ == '__main__':
     if len(sys.argv) == 2:
         main(sys.argv[1])
+    elif len(sys.argv) == 3:
+        main(sys.argv[1], int(sys.argv[2]))
     else:
-        print("Usage:", '\\n', '$ python {fn} logfile')
+        print("Usage:", '\\n', '$ python {fn} logfile [processes]')
 '''
 
 
@@ -57,9 +79,15 @@ def triad_to_string(triad, indent: int=3):
 
 
 def write_code(src_path: str, pie_root: str, s: str, regexp: str, triads: list,
-               unc=True):
+               unc=True, pattern=None, split=None, head=None,
+               filename=None):
+    """
+    Write the source of a reader to src_path.
+    :param filename: the name of the file to run in the usage message,
+    defaults to the name of src_path
+    """
     class_names = map(lambda triad: triad[1].__name__, triads)
-    src_filename = os.path.split(src_path)[1]
+    src_filename = filename or os.path.split(src_path)[1]
     readable_triad = "[\n{}]".format(', \n'.join(map(triad_to_string, triads)))
     # add imports
     imports = []
@@ -69,12 +97,20 @@ def write_code(src_path: str, pie_root: str, s: str, regexp: str, triads: list,
     src = READER_TPL.format(s=s.title(), fn=src_filename, pie_root=pie_root,
                             regexp=repr(regexp), triads=readable_triad,
                             directive_import='\n'.join(imports),
-                            unc=str(unc))
+                            unc=str(unc), logsys=repr(s),
+                            pattern=repr(pattern), split=repr(split),
+                            head=repr(head),
+                            record=record_source(s.title() + 'Record',
+                                                 triads))
     with open(src_path, 'a') as src_file:
         src_file.writelines(src)
 
 
-def make_reader(s, pattern) -> str:
+def init_gen_root() -> (str, str):
+    """
+    Make sure reader/gen exists as a package.
+    :return: the absolute path of reader/gen and the root of LogPie
+    """
     # get absolute root of package reader
     generate_abp = os.path.abspath(__file__)
     reader_root = os.path.split(generate_abp)[0]
@@ -82,22 +118,92 @@ def make_reader(s, pattern) -> str:
     pie_root = os.path.split(reader_root)[0]
     # init gen as a empty module
     if not os.path.exists(gen_root):
-        os.mkdir(gen_root)
+        os.makedirs(gen_root, exist_ok=True)
         shutil.copy(reader_root + '/__init__.py', gen_root + '/__init__.py')
+    return gen_root, pie_root
+
+
+def parse_pattern(s, pattern) -> (str, list):
     # chose the given pattern module
     pm = S_ROUTER[s]
     # print(pm, hasattr(pm, 'parser'), dir(pm))
     if not hasattr(pm, 'parser'):
         raise RuntimeError('{} is not a available pattern parser.'.format(s))
-    else:
-        # get regexp & triads to build the reader
-        pattern_parser = pm.parser
-        regexp, build_triads = pattern_parser(pattern)
-        # initialize the new reader's source file
-        filepath = gen_filepath(s, gen_root)
-        # at last then write in generated new code
-        write_code(filepath, pie_root, s, regexp, build_triads)
-        return filepath
+    # get regexp & triads to build the reader
+    return pm.parser(pattern)
+
+
+def parse_split(s, pattern) -> str:
+    """
+    Returns the source of the split parser for the pattern, or None.
+    """
+    pm = S_ROUTER[s]
+    if not hasattr(pm, 'split_parser'):
+        return None
+    return pm.split_parser(pattern)
+
+
+def parse_head(s, pattern) -> str:
+    """
+    Returns the regexp of the record heads for the pattern, or None.
+    """
+    pm = S_ROUTER[s]
+    if not hasattr(pm, 'head_parser'):
+        return None
+    return pm.head_parser(pattern)
+
+
+def make_reader(s, pattern) -> str:
+    gen_root, pie_root = init_gen_root()
+    regexp, build_triads = parse_pattern(s, pattern)
+    # initialize the new reader's source file
+    filepath = gen_filepath(s, gen_root)
+    # at last then write in generated new code
+    write_code(filepath, pie_root, s, regexp, build_triads, pattern=pattern,
+               split=parse_split(s, pattern), head=parse_head(s, pattern))
+    return filepath
+
+
+def reader_digest(s, pattern) -> str:
+    """
+    The content address of a reader, a hash of (logsys, pattern, VERSION).
+    """
+    key = json.dumps([s, pattern, VERSION])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def load_reader(s, pattern) -> type:
+    """
+    Returns the reader class for the logsys `s` and `pattern`.
+    Readers are cached in memory and on disk by reader_digest, as
+    reader/gen/<logsys>_<digest>.py, whose bytecode is cached by the import
+    system, so the pattern is parsed and the source written only once.
+    """
+    digest = reader_digest(s, pattern)
+    reader_cls = READERS.get(digest)
+    if reader_cls is not None:
+        return reader_cls
+    gen_root, pie_root = init_gen_root()
+    name = '{}_{}'.format(s, digest)
+    filepath = '{}/{}.py'.format(gen_root, name)
+    if not os.path.exists(filepath):
+        regexp, build_triads = parse_pattern(s, pattern)
+        # write aside and rename, so concurrent jobs never see a partial file
+        temp_path = '{}.{}.tmp'.format(filepath, os.getpid())
+        write_code(temp_path, pie_root, s, regexp, build_triads,
+                   pattern=pattern, split=parse_split(s, pattern),
+                   head=parse_head(s, pattern),
+                   filename=os.path.split(filepath)[1])
+        os.replace(temp_path, filepath)
+    module_name = 'reader.gen.' + name
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, filepath)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    reader_cls = READERS[digest] = getattr(module, s.title() + 'LogReader')
+    return reader_cls
 
 
 def main():
@@ -8,6 +8,230 @@ this reader, will be changed.
 
 import re
 import os.path
+import sys
+import hashlib
+import json
+import time
+import locale
+import mmap
+from itertools import islice
+
+from . import compress
+from .cache import ResultCache
+from .index import SparseIndex
+from .stats import ReaderStats
+from .pattern import ROUTER
+from .pattern.common import compile_splitter, group_name
+
+
+def import_numpy():
+    """
+    Returns the numpy module, or None if it is missing.
+    numpy is optional and slow to import, so it is only imported by the
+    readers of columns.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class GeneralRecord(object):
+    """
+    The base of the record classes generated with each reader.
+    A record keeps one slot per triad key, named by group_name, and can be
+    read like the dict it replaces, e.g. record['logger.namespace'].
+    """
+    __slots__ = ()
+    # the triad keys, in the order of the slots
+    KEYS = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, group_name(key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def get(self, key, default=None):
+        return getattr(self, group_name(key), default)
+
+    def keys(self):
+        return self.KEYS
+
+    def values(self):
+        return [getattr(self, group_name(key)) for key in self.KEYS]
+
+    def items(self):
+        return list(zip(self.KEYS, self.values()))
+
+    def as_dict(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, GeneralRecord):
+            return self.items() == other.items()
+        elif isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(group_name(key), value)
+            for key, value in self.items()))
+
+
+class LazyRecord(GeneralRecord):
+    """
+    A record keeping the raw segments of a match, which builds a field only
+    the first time it is read and then keeps the built value.
+    Each lazy reader makes its own sub class, see GeneralReader.lazy, whose
+    builders belong to the reader; so a lazy record is pickled as the eager
+    record the reader would build, of EAGER_CLS or a dict.
+    """
+    __slots__ = ('_segments', '_values')
+    # the key of each segment, in the order of triads
+    FIELDS = ()
+    # attribute -> index of its segment
+    ATTRS = dict()
+    # the function building each segment, None if it needs no build
+    BUILDERS = ()
+    # the record class of the eager reader, None for a dict
+    EAGER_CLS = None
+
+    def __init__(self, segments):
+        self._segments = segments
+        self._values = None
+
+    def __getattr__(self, attr):
+        try:
+            index = self.ATTRS[attr]
+        except KeyError:
+            raise AttributeError(attr)
+        return self._field(index)
+
+    def __reduce__(self):
+        values = [self._field(index) for index in range(len(self.BUILDERS))]
+        if self.EAGER_CLS is not None:
+            return self.EAGER_CLS, tuple(values)
+        return dict, (list(zip(self.FIELDS, values)),)
+
+    def _field(self, index: int):
+        builder = self.BUILDERS[index]
+        if builder is None:
+            return self._segments[index]
+        values = self._values
+        if values is None:
+            values = self._values = dict()
+        elif index in values:
+            return values[index]
+        value = values[index] = builder(self._segments[index])
+        return value
+
+
+RECORD_TPL = '''
+class {name}(GeneralRecord):
+    __slots__ = {slots}
+    KEYS = {keys}
+
+    def __init__(self, {params}):
+{assigns}
+'''
+
+
+def record_source(name: str, triads: list, indent: int=2) -> str:
+    """
+    Returns the source of a GeneralRecord sub class holding the fields of
+    `triads`, whose __init__ takes the segments in the order of triads.
+    A key repeated in the pattern keeps its last segment, like a dict.
+    """
+    keys = []
+    params = []
+    assigns = []
+    for key, cls, additional in triads:
+        attr = group_name(key)
+        param = attr
+        if key in keys:
+            param = '{}_{}'.format(attr, len(params))
+        else:
+            keys.append(key)
+        params.append(param)
+        assigns.append(' ' * (indent * 4) + 'self.{} = {}'.format(attr, param))
+    slots = tuple(group_name(key) for key in keys)
+    return RECORD_TPL.format(name=name, slots=repr(slots),
+                             keys=repr(tuple(keys)), params=', '.join(params),
+                             assigns='\n'.join(assigns) or
+                             ' ' * (indent * 4) + 'pass')
+
+
+def make_record_cls(name: str, triads: list) -> type:
+    """
+    Make the GeneralRecord sub class of record_source at runtime.
+    """
+    namespace = {'GeneralRecord': GeneralRecord}
+    exec(record_source(name, triads), namespace)
+    return namespace[name]
+
+
+class RecordAssembler(object):
+    """
+    Group lines into records: a line matching the head regexp starts a new
+    record, and any other line continues the current one.
+    Lines before the first record head are dropped, and so are the
+    continuation lines beyond `limit` characters.
+    """
+
+    def __init__(self, match: callable, limit: int=None):
+        """
+        :param match: the match method of the head regexp
+        :param limit: the characters a record keeps at most, None for no
+        limit
+        """
+        self.match = match
+        self.limit = limit
+        # the lines of the record waiting for its end, None before a head
+        self.pending = None
+        self.size = 0
+        # the offset given with the head of the pending record
+        self.offset = None
+
+    def feed(self, line: str, offset: int=None) -> str:
+        """
+        Add a line, returns the record it ends, or None.
+        :param offset: where the line starts, kept if it is a record head
+        """
+        if self.match(line):
+            record = self.flush()
+            self.pending = [line]
+            self.size = len(line)
+            self.offset = offset
+            return record
+        if self.pending is not None:
+            if self.limit is not None:
+                self.size += len(line)
+                if self.size > self.limit:
+                    return None
+            self.pending.append(line)
+        return None
+
+    def flush(self) -> str:
+        """
+        Returns the pending record and forget it, or None if there is none.
+        """
+        pending = self.pending
+        if pending is None:
+            return None
+        self.pending = None
+        return pending[0] if len(pending) == 1 else ''.join(pending)
 
 
 class GeneralReader(object):
@@ -16,6 +240,16 @@ class GeneralReader(object):
     """
     # This will be overwrite by each sub classes
 
+    # the logsys and pattern the reader is generated from, see project()
+    LOGSYS = None
+    PATTERN = None
+
+    # fields copied to the readers working in readall_parallel's pool
+    WORKER_FIELDS = ('encoding', 'regexp', 'triads', 'using_named_capture',
+                     'tolerant', 'year', 'record_cls', 'filters',
+                     'split_source', 'using_split', 'head_regexp',
+                     'max_record_size')
+
     def __init__(self, lines):
         """
         Initialize an instance with correct #lines#.
@@ -25,10 +259,47 @@ class GeneralReader(object):
         # the regexp to capture segments in a single-line
         self.regexp = r''
         self.using_named_capture = False
+        # the cheaper regexp telling a record head from a continuation line,
+        # None to use the regexp
+        self.head_regexp = None
+        # the characters a record keeps at most, the continuation lines
+        # beyond are dropped; None for no limit
+        self.max_record_size = None
+        # the source of a split parser cutting the segments out of a record
+        # without the regexp, which is kept for the records it cannot split,
+        # None if the pattern cannot be split
+        self.split_source = None
+        # if set to True, records are split by split_source before trying
+        # the regexp. In CPython this pays only when the regexp backtracks a
+        # lot, like a lazy %x over long records; otherwise one match of the
+        # regexp is faster than the finds and slices of a split parser
+        self.using_split = False
         # a list of triads with a key, a class like Log4jDate
         # and a tuple of addition information to call cls.build
         self.triads = []
         self.triads_dict = dict()
+        # the group names of triads, see segments
+        self.group_names = None
+        # the GeneralRecord sub class to hold a log item, None for a dict
+        self.record_cls = None
+        # (key, function) pairs made from triads, see _init_builders
+        self.builders = None
+        # if set to True, log items are LazyRecords building each field on
+        # its first read, and pickled as eager records; readall_parallel
+        # always builds eagerly
+        self.lazy = False
+        self.lazy_cls = None
+        # the predicates given to filter(), None to read every record
+        self.filters = None
+        # the SparseIndex given by use_index()
+        self.index = None
+        # the ResultCache given by use_cache()
+        self.result_cache = None
+        # the ReaderStats given by enable_stats(), None for no instrumentation
+        self.stats = None
+        # the year of the first record, for log systems whose timestamps
+        # omit it; None to infer it
+        self.year = None
         # cache compiled re if using iterable accessing
         self.compiled_re = None
         # reader behavior flags
@@ -36,21 +307,25 @@ class GeneralReader(object):
         # if set to True, reader will pass when some line cannot match the
         # given regexp
         self.tolerant = False
+        # if set to True, a plain log file is memory-mapped and matched as
+        # bytes
+        self.using_mmap = False
+        # encoding of the log file, None for the locale's preferred one
+        self.encoding = None
+        # the compression of the log file, like 'gzip', None for plain text
+        self.compression = None
         # resources
         self.lines = None
         self.path = None
         self.cache = []
         self.file_bind = None
-        self.iter_log_bind = None
-        self.iter_lineno = 1
-        self.iter_inited = False
         self.next_line_inited = False
         self.next_line_bind = None
-        self.next_line_cache = None
         # if lines is  a path to file, keep the path and set flag
         if isinstance(lines, str) and os.path.exists(lines):
             self.path = lines
             self.using_file = True
+            self.compression = compress.detect(lines)
         # if line is a iterable object, bind it to self.lines
         elif hasattr(lines, '__iter__'):
             self.lines = lines
@@ -61,11 +336,202 @@ class GeneralReader(object):
                 'nor a iterable object.'
                 .format(type(lines)))
 
+    def project(self, keys):
+        """
+        Capture only the fields of `keys`, like {'date', 'level'}.
+        The pattern is parsed again so that the other directives become
+        non-capturing groups and need no build.
+        """
+        if self.PATTERN is None:
+            raise RuntimeError('{} is not generated from a pattern.'
+                               .format(type(self).__name__))
+        pattern_module = ROUTER[self.LOGSYS]
+        self.regexp, self.triads = pattern_module.parser(
+            self.PATTERN, keys=frozenset(keys))
+        if self.split_source is not None:
+            self.split_source = pattern_module.split_parser(
+                self.PATTERN, keys=frozenset(keys))
+        self.triads_dict = {key: (cls, arg) for key, cls, arg in self.triads}
+        self.compiled_re = None
+        self.group_names = None
+        self.builders = None
+        if self.record_cls is not None:
+            # keep the projected record class next to the generated one, so
+            # its records can be pickled
+            module = sys.modules[self.record_cls.__module__]
+            name = '_'.join([self.record_cls.__name__] +
+                            [group_name(key) for key, _, _ in self.triads])
+            record_cls = getattr(module, name, None)
+            if record_cls is None:
+                record_cls = make_record_cls(name, self.triads)
+                record_cls.__module__ = module.__name__
+                setattr(module, name, record_cls)
+            self.record_cls = record_cls
+
+    def pattern_digest(self) -> str:
+        """
+        A hash of what decides the parsed result: the regexp and the triads.
+        """
+        triads = [(key, cls.__module__, cls.__name__, addition)
+                  for key, cls, addition in self.triads]
+        key = repr((self.regexp, triads, self.using_named_capture))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def use_index(self, step: int=1000, index_path: str=None):
+        """
+        Keep a SparseIndex beside the log file, updated with the file, and
+        use it to seek to the time window given to filter().
+        The window is found assuming timestamps grow through the file.
+        :param step: index one record in every `step` records
+        :param index_path: where to keep the index, defaults to the path of
+        the log file plus '.lpidx'
+        """
+        if not self.using_file or self.compression:
+            raise TypeError('Only a plain log file can be indexed.')
+        self.index = SparseIndex.open(self, step, index_path)
+        return self
+
+    def enable_stats(self):
+        """
+        Count and time each stage of reading in self.stats, a ReaderStats:
+        the lines read, the record-head and full regexp matches, and the
+        builds of each directive class. Use self.stats.as_dict() to export.
+        The mmap path only counts builds, and the workers of
+        readall_parallel are not counted.
+        """
+        self.stats = ReaderStats()
+        # builders are wrapped as they are made
+        self.builders = None
+        return self
+
+    def use_cache(self, cache_path: str=None):
+        """
+        Keep the built records in a ResultCache beside the log file, so
+        readall() on the unchanged file loads them instead of parsing, and
+        on an appended file only parses the new tail.
+        Records read from the cache are always built, even for a lazy
+        reader, and readall() with filters ignores the cache.
+        :param cache_path: where to keep the cache, defaults to the path of
+        the log file plus '.lpcache'
+        """
+        if not self.using_file or self.compression:
+            raise TypeError('Only a plain log file can be cached.')
+        self.result_cache = ResultCache(self.path, self.pattern_digest(),
+                                        cache_path)
+        return self
+
+    def _open_lines(self):
+        """
+        Open a fresh line source, a file object or an iterator over lines.
+        Compressed files are decompressed by a background thread.
+        """
+        if self.using_file and self.compression:
+            lines = compress.iter_lines(
+                self.path, self.compression,
+                self.encoding or locale.getpreferredencoding(False))
+        elif self.using_file:
+            lines = open(self.path, encoding=self.encoding)
+        else:
+            lines = iter(self.lines)
+        if self.stats is not None:
+            lines = self.stats.wrap_lines(lines)
+        return lines
+
+    def _matcher(self, stage: str='match') -> callable:
+        """
+        Returns the match method of the compiled regexp, or of the head
+        regexp for the 'head' stage, counted in the `stage` of self.stats if
+        stats are enabled.
+        """
+        regexp = self.regexp
+        if stage == 'head' and self.head_regexp is not None:
+            regexp = self.head_regexp
+        match = re.compile(regexp).match
+        if self.stats is not None:
+            match = self.stats.wrap_match(getattr(self.stats, stage), match)
+        return match
+
+    def _splitter(self):
+        """
+        Returns the split parser of split_source, counted in the split stage
+        of self.stats if stats are enabled, or None if it is not used.
+        """
+        if not self.using_split or self.split_source is None:
+            return None
+        split = compile_splitter(self.split_source)
+        if self.stats is not None:
+            split = self.stats.wrap_match(self.stats.split, split)
+        return split
+
+    def _range_lines(self, start: int, end: int=None):
+        """
+        Yield the decoded lines of the records whose head starts within
+        the byte range [start, end) of the log file, `end` None for the end
+        of the file.
+        The range is moved forward to the first record head at or after
+        `start`, and continues past `end` until the next record head, so a
+        multi-line record always belongs to exactly one range.
+        """
+        match = self._matcher('head')
+        encoding = self.encoding or locale.getpreferredencoding(False)
+        with open(self.path, 'rb') as log_file:
+            if start > 0:
+                log_file.seek(start - 1)
+                # not at the beginning of a line, skip the partial one
+                if log_file.read(1) != b'\n':
+                    log_file.readline()
+            offset = log_file.tell()
+            # skip continuation lines belonging to the previous range
+            for raw in log_file:
+                line = raw.decode(encoding)
+                if match(line):
+                    break
+                offset += len(raw)
+            else:
+                return
+            if end is not None and offset >= end:
+                return
+            yield line
+            offset += len(raw)
+            for raw in log_file:
+                line = raw.decode(encoding)
+                if end is not None and offset >= end and match(line):
+                    break
+                yield line
+                offset += len(raw)
+
+    def _split_ranges(self, chunks: int) -> list:
+        """
+        Split the log file into about `chunks` byte ranges.
+        """
+        size = os.path.getsize(self.path)
+        step = max(size // max(chunks, 1), 1)
+        return [(start, min(start + step, size))
+                for start in range(0, size, step)]
+
+    def _assembler(self) -> RecordAssembler:
+        return RecordAssembler(self._matcher('head'), self.max_record_size)
+
+    def _iter_records(self, lines):
+        """
+        Group lines into records, see RecordAssembler.
+        """
+        assembler = self._assembler()
+        feed = assembler.feed
+        for line in lines:
+            record = feed(line)
+            if record is not None:
+                yield record
+        record = assembler.flush()
+        if record is not None:
+            yield record
+
     def _init_next_line(self):
         if self.using_file:
-            self.next_line_bind = open(self.path)
+            self.file_bind = self._open_lines()
+            self.next_line_bind = self._iter_records(self.file_bind)
         else:
-            self.next_line_bind = iter(self.lines)
+            self.next_line_bind = self._iter_records(self._open_lines())
 
     def next_line(self) -> str:
         """
@@ -75,62 +541,121 @@ class GeneralReader(object):
         if not self.next_line_inited:
             self._init_next_line()
             self.next_line_inited = True
-        head = None
-        meet_head = False
-        compiled_re = re.compile(self.regexp)
-        try:
-            if self.next_line_cache:
-                head = self.next_line_cache
-                meet_head = True
-                self.next_line_cache = None
-            for line in self.next_line_bind:
-                if compiled_re.match(line):
-                    if meet_head:
-                        self.next_line_cache = line
-                        break
-                    else:
-                        head = line
-                        meet_head = True
-                else:
-                    if meet_head:
-                        head += line
-        except IOError as io:
-            raise io
-        if head:
-            return head
-        else:
-            raise StopIteration
+        return next(self.next_line_bind)
 
-    def process_matches(self, match):
+    def segments(self, match) -> list:
+        """
+        Returns the captured segments of a match, in the order of triads.
+        """
         if self.using_named_capture:
-            matchd = match.groupdict()
-            for key in self.triads_dict:
-                cls, addition = self.triads_dict[key]
-                matchd[key] = cls.build(matchd[key], *addition)
-            self.cache.append(match)
+            names = self.group_names
+            if names is None:
+                names = self.group_names = tuple(
+                    group_name(key) for key, _, _ in self.triads)
+            if len(names) > 1:
+                return match.group(*names)
+            return tuple(match.group(name) for name in names)
         else:
-            log_item = dict()
-            mixup = zip(self.triads, match)
-            for (key, cls, addition), segment in mixup:
-                if cls.NEED_BUILD:
-                    log_item[key] = cls.build(segment, *addition)
-                else:
-                    log_item[key] = segment
-            self.cache.append(log_item)
+            return match.groups()
+
+    def _init_builders(self):
+        """
+        Ask each directive for the function building its segments.
+        """
+        self.builders = [
+            (key, cls.builder(self, *addition) if cls.NEED_BUILD else None)
+            for key, cls, addition in self.triads]
+        if self.stats is not None:
+            self.builders = [
+                (key, self.stats.wrap_builder(cls.__name__, builder)
+                 if builder else None)
+                for (key, builder), (_, cls, _) in zip(self.builders,
+                                                       self.triads)]
+        self.lazy_cls = None
+        if self.lazy:
+            self._lazy_record_cls()
+
+    def _lazy_record_cls(self) -> type:
+        """
+        Returns the LazyRecord sub class of the builders and record_cls,
+        made again when either changed, so `lazy` may be set at any time.
+        """
+        if self.builders is None:
+            self._init_builders()
+        lazy_cls = self.lazy_cls
+        if lazy_cls is not None and lazy_cls.EAGER_CLS is self.record_cls:
+            return lazy_cls
+        attrs = {group_name(key): index
+                 for index, (key, builder) in enumerate(self.builders)}
+        self.lazy_cls = type('LazyRecord', (LazyRecord,), {
+            '__slots__': (),
+            'KEYS': tuple(dict.fromkeys(key for key, _ in self.builders)),
+            'FIELDS': tuple(key for key, _ in self.builders),
+            'EAGER_CLS': self.record_cls,
+            'ATTRS': attrs,
+            'BUILDERS': tuple(builder for _, builder in self.builders)})
+        return self.lazy_cls
+
+    def build_segments(self, segments):
+        """
+        Build a log item from the captured segments.
+        """
+        if self.builders is None:
+            self._init_builders()
+        if self.lazy:
+            return self._lazy_record_cls()(segments)
+        if self.record_cls is not None:
+            return self.record_cls(*[
+                builder(segment) if builder else segment
+                for (key, builder), segment in zip(self.builders, segments)])
+        log_item = dict()
+        mixup = zip(self.builders, segments)
+        for (key, builder), segment in mixup:
+            if builder:
+                log_item[key] = builder(segment)
+            else:
+                log_item[key] = segment
+        return log_item
+
+    def build_record(self, match):
+        """
+        Build a log item from a match of the regexp.
+        """
+        return self.build_segments(self.segments(match))
+
+    def process_matches(self, match):
+        self.cache.append(self.build_record(match))
 
     def readall(self):
         """
         The core reader of the general line-based reader.
         WARNING: This will use A LOT OF MEMORY.
         """
+        if self.result_cache is not None and self.filters is None:
+            if self.builders is None:
+                self._init_builders()
+            self.cache = self.result_cache.read(self)
+            return self.cache
+        if (self.using_mmap and self.using_file and
+                not self.compression) or self.filters is not None or \
+                self._stamper() is not None:
+            self.cache = list(self)
+            return self.cache
         lineno = 1
-        compiled_re = re.compile(self.regexp)
+        matcher = self._matcher()
+        split = self._splitter()
         while True:
             try:
                 line = self.next_line()
             except StopIteration:
                 break
-            match = compiled_re.match(line)
+            if split is not None:
+                segments = split(line)
+                if segments is not None:
+                    self.cache.append(self.build_segments(segments))
+                    lineno += 1
+                    continue
+            match = matcher(line)
             if match:
                 self.process_matches(match)
             else:
@@ -144,46 +669,518 @@ class GeneralReader(object):
             lineno += 1
         return self.cache
 
-    def _init_iter(self):
-        if self.using_file:
-            self.iter_log_bind = open(self.path)
-        else:
-            self.iter_log_bind = iter(self.lines)
-        self.compiled_re = re.compile(self.regexp)
+    def filter(self, levels=None, since=None, until=None, contains=None):
+        """
+        Only read the records passing all the given predicates.
+        Cheap checks run first: `contains` and a substring test of `levels`
+        reject a record before it is matched, and only the timestamp is
+        built to test the time range.
+        :param levels: the accepted values of the 'level' field, e.g.
+        {'ERROR', 'FATAL'}
+        :param since: the earliest accepted timestamp, inclusive
+        :param until: the latest accepted timestamp, exclusive
+        :param contains: a substring the raw record must contain
+        """
+        keys = [key for key, _, _ in self.triads]
+        if levels is not None and 'level' not in keys:
+            raise ValueError('Cannot filter levels, no level is captured.')
+        if (since is not None or until is not None) and \
+                self._timestamp_index() is None:
+            raise ValueError('Cannot filter time, no timestamp is captured.')
+        self.filters = {
+            'levels': frozenset(levels) if levels is not None else None,
+            'since': since, 'until': until, 'contains': contains}
+        return self
 
-    def __iter__(self):
+    def _timestamp_index(self):
         """
-        use this instant of calling execute()
-        :return:
+        The index of the first timestamp in triads, or None.
         """
-        if not self.iter_inited:
-            self._init_iter()
-            self.iter_inited = True
-        if self.cache:
-            yield self.cache.pop(0)
-        else:
-            try:
-                line = next(self.iter_log_bind)
-                matches = self.compiled_re.findall(line)
-                if matches:
-                    self.process_matches(matches)
-                elif not matches and not self.tolerant:
+        for index, (key, cls, addition) in enumerate(self.triads):
+            if cls.TIMESTAMP:
+                return index
+        return None
+
+    def _make_filters(self):
+        """
+        Returns the checks of self.filters on a raw record and on its
+        segments, each None if it has nothing to check.
+        """
+        if self.filters is None:
+            return None, None
+        if self.builders is None:
+            self._init_builders()
+        levels = self.filters['levels']
+        since, until = self.filters['since'], self.filters['until']
+        contains = self.filters['contains']
+        level_index = [key for key, _ in self.builders].index('level') \
+            if levels is not None else None
+        time_index = self._timestamp_index()
+        time_builder = self.builders[time_index][1] \
+            if time_index is not None else None
+
+        def check_record(record: str) -> bool:
+            if contains is not None and contains not in record:
+                return False
+            if levels is not None and \
+                    not any(level in record for level in levels):
+                return False
+            return True
+
+        def check_segments(segments) -> bool:
+            if levels is not None and segments[level_index] not in levels:
+                return False
+            if since is not None or until is not None:
+                timestamp = time_builder(segments[time_index])
+                if since is not None and timestamp < since:
+                    return False
+                if until is not None and timestamp >= until:
+                    return False
+            return True
+
+        if contains is None and levels is None:
+            check_record = None
+        if levels is None and since is None and until is None:
+            check_segments = None
+        return check_record, check_segments
+
+    def _stamper(self):
+        """
+        Returns a function stamping the segments of each record in file
+        order, see GeneralDirective.stamper, or None if no directive needs
+        it. Each pass over the file makes a fresh one.
+        """
+        stampers = [(index, cls.stamper(self, *addition))
+                    for index, (key, cls, addition) in enumerate(self.triads)]
+        stampers = [(index, stamper) for index, stamper in stampers
+                    if stamper is not None]
+        if not stampers:
+            return None
+
+        def stamp(segments) -> list:
+            segments = list(segments)
+            for index, stamper in stampers:
+                segments[index] = stamper(segments[index])
+            return segments
+
+        return stamp
+
+    def _record_matcher(self, stamp=None, source: str=None) -> callable:
+        """
+        Returns a function matching one record, which takes the record and
+        its number and returns its captured segments, or None if a filter
+        rejects it or the reader is tolerant and the regexp cannot match.
+        :param stamp: the stamper of the pass, records are stamped in the
+        order they are given
+        :param source: the name of the input in errors, defaults to the path
+        or '<ITER>'
+        """
+        matcher = self._matcher()
+        split = self._splitter()
+        check_record, check_segments = self._make_filters()
+        if source is None:
+            source = self.path if self.using_file else '<ITER>'
+
+        def match_record(record: str, lineno: int):
+            # a stamper sees every record, so only check after matching
+            if check_record and stamp is None and not check_record(record):
+                return None
+            segments = split(record) if split is not None else None
+            if segments is None:
+                match = matcher(record)
+                if not match:
+                    if self.tolerant:
+                        return None
                     raise ValueError(
                         '{}:{}: Line \'{}\' Cannot matches {}.'
-                        .format(self.path if self.using_file else '<ITER>',
-                                self.iter_lineno, line, self.regexp))
-            except StopIteration as si:
-                raise si
-        if self.cache:
-            yield self.cache.pop(0)
-        else:
-            raise StopIteration()
+                        .format(source, lineno, record, self.regexp))
+                segments = self.segments(match)
+            if stamp is not None:
+                segments = stamp(segments)
+                if check_record and not check_record(record):
+                    return None
+            if check_segments and not check_segments(segments):
+                return None
+            return segments
+
+        return match_record
+
+    def _match_records(self, records, stamp=None):
+        """
+        Match each record, yielding its captured segments.
+        :param stamp: the stamper of the pass, if it goes on over several
+        calls; defaults to a fresh one
+        """
+        match_record = self._record_matcher(stamp or self._stamper())
+        lineno = 0
+        for record in records:
+            lineno += 1
+            segments = match_record(record, lineno)
+            if segments is not None:
+                yield segments
+
+    def _parse_records(self, records, stamp=None):
+        """
+        Match and build each record, yielding the log items.
+        """
+        for segments in self._match_records(records, stamp):
+            yield self.build_segments(segments)
+
+    def _iter_segments(self):
+        """
+        Stream the captured segments of each record from a fresh source.
+        """
+        if self.using_mmap and self.using_file and not self.compression:
+            yield from self._iter_mmap()
+            return
+        # a stamper has to start at the first record
+        if self.index is not None and self.filters is not None and \
+                (self.filters['since'] is not None or
+                 self.filters['until'] is not None) and \
+                self._stamper() is None:
+            # only parse the slice of the file the time window falls in
+            start, end = self.index.window(self.filters['since'],
+                                           self.filters['until'])
+            lines = self._range_lines(start, end)
+            if self.stats is not None:
+                lines = self.stats.wrap_lines(lines)
+            yield from self._match_records(self._iter_records(lines))
+            return
+        lines = self._open_lines()
+        try:
+            yield from self._match_records(self._iter_records(lines))
+        finally:
+            if self.using_file:
+                lines.close()
+
+    def __iter__(self):
+        """
+        Stream the log, yielding one log item per record.
+        Each call opens its own line source, and only the record being
+        parsed is held in memory, so this suits files of any size.
+        """
+        for segments in self._iter_segments():
+            yield self.build_segments(segments)
+
+    def _build_columns(self, batch: list) -> list:
+        """
+        Build a batch of segments column by column, so the builders run in
+        C-level maps rather than once per record in Python.
+        Returns one list of built values per triad.
+        """
+        return [list(map(builder, column)) if builder else list(column)
+                for (key, builder), column in zip(self.builders,
+                                                  zip(*batch))]
+
+    def _assemble(self, built: list) -> list:
+        """
+        Make the log items of the built columns, in records of record_cls or
+        dicts.
+        """
+        if not built:
+            return []
+        if self.record_cls is not None:
+            return list(map(self.record_cls, *built))
+        keys = [key for key, _ in self.builders]
+        return [dict(zip(keys, row)) for row in zip(*built)]
+
+    def _build_batch(self, batch: list, columns: bool=False):
+        """
+        Build the log items of a batch of segments.
+        Returns a list of log items, or with `columns` a dict of numpy
+        arrays as readall_columns gives.
+        """
+        if self.lazy and not columns:
+            return list(map(self._lazy_record_cls(), batch))
+        built = self._build_columns(batch)
+        if columns:
+            numpy = import_numpy()
+            return {key: numpy.array(column, dtype=cls.COLUMN_TYPE)
+                    for (key, cls, addition), column in zip(self.triads,
+                                                            built)}
+        if not built:
+            return [self.build_segments(segments) for segments in batch]
+        return self._assemble(built)
+
+    def read_batches(self, size: int=4096, columns: bool=False):
+        """
+        Stream the log in batches of `size` log items, each a list, or with
+        `columns` a dict of numpy arrays like readall_columns gives.
+        Only one batch is held in memory at once, and the per-record costs
+        of building are paid once per batch.
+        :param size: the number of log items in a batch, the last one may
+        be shorter
+        :param columns: if True, yield columns instead, requires numpy
+        """
+        if columns and import_numpy() is None:
+            raise ImportError('read_batches(columns=True) requires numpy.')
+        if self.builders is None:
+            self._init_builders()
+        segments = self._iter_segments()
+        while True:
+            batch = list(islice(segments, size))
+            if not batch:
+                return
+            yield self._build_batch(batch, columns)
+
+    def readall_columns(self) -> dict:
+        """
+        Read the whole log into columns instead of a list of dicts.
+        Returns a dict mapping each triad key to a numpy array, typed by the
+        COLUMN_TYPE of its directive: datetime64[us] for dates, int64 for
+        numbers and object for the others.
+        Requires numpy.
+        """
+        numpy = import_numpy()
+        if numpy is None:
+            raise ImportError('readall_columns() requires numpy.')
+        if self.builders is None:
+            self._init_builders()
+        columns = [[] for _ in self.triads]
+        appends = [column.append for column in columns]
+        for segments in self._iter_segments():
+            mixup = zip(appends, self.builders, segments)
+            for append, (key, builder), segment in mixup:
+                if builder:
+                    append(builder(segment))
+                else:
+                    append(segment)
+        return {key: numpy.array(column, dtype=cls.COLUMN_TYPE)
+                for (key, cls, addition), column in zip(self.triads, columns)}
+
+    def _iter_mmap(self):
+        """
+        Memory-map the log file and match a bytes version of the regexp
+        directly over the mapping. Each line the regexp matches starts a
+        record, which runs until the next match; only its captured segments
+        are decoded, and the whole record only if a filter checks it.
+        The lines between matches must be continuation lines, a record head
+        among them is a record the regexp cannot match.
+        """
+        encoding = self.encoding or locale.getpreferredencoding(False)
+        bytes_re = re.compile(b'(?m)^' + self.regexp.encode(encoding))
+        head_re = None
+        if not self.tolerant and self.head_regexp is not None:
+            head_re = re.compile(b'(?m)^' + self.head_regexp.encode(encoding))
+
+        def check_gap(mapping, start: int, end: int, lineno: int):
+            head = head_re.search(mapping, start, end)
+            if head:
+                line_end = mapping.find(b'\n', head.start(), end)
+                line = mapping[head.start():line_end if line_end != -1
+                               else end].decode(encoding, 'replace')
+                raise ValueError(
+                    '{}:{}: Line \'{}\' Cannot matches {}.'
+                    .format(self.path, lineno, line, self.regexp))
+
+        def iter_matches(mapping):
+            """
+            Yield each match with the end of its record.
+            """
+            previous, lineno = None, 1
+            for match in bytes_re.finditer(mapping):
+                if previous is not None:
+                    yield previous, match.start()
+                if head_re is not None:
+                    check_gap(mapping, previous.end() if previous else 0,
+                              match.start(), lineno)
+                previous, lineno = match, lineno + 1
+            if previous is not None:
+                yield previous, len(mapping)
+            if head_re is not None:
+                check_gap(mapping, previous.end() if previous else 0,
+                          len(mapping), lineno)
+
+        with open(self.path, 'rb') as log_file:
+            if os.fstat(log_file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(log_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapping:
+                check_record, check_segments = self._make_filters()
+                stamp = self._stamper()
+                for match, end in iter_matches(mapping):
+                    # a stamper sees every record, so only check after it
+                    if check_record and stamp is None and not check_record(
+                            mapping[match.start():end].decode(encoding)):
+                        continue
+                    segments = [segment.decode(encoding)
+                                for segment in self.segments(match)]
+                    if stamp is not None:
+                        segments = stamp(segments)
+                        if check_record and not check_record(
+                                mapping[match.start():end].decode(encoding)):
+                            continue
+                    if check_segments and not check_segments(segments):
+                        continue
+                    yield segments
+
+    def follow(self, checkpoint: str=None, interval: float=1.0,
+               flush_after: float=None, timeout: float=None,
+               batch_size: int=4096):
+        """
+        Follow the log file like `tail -F`, yielding records as they are
+        appended.
+        A record is yielded once the next record head arrives, since more
+        continuation lines may still be written; a line without its line
+        break is left until it is complete.
+        The file is reopened when its inode changes and read again from the
+        beginning when it shrinks, as logrotate does.
+        :param checkpoint: a file keeping the inode and the offset of the
+        first byte not yet yielded, a restarted reader resumes from there
+        :param interval: seconds to sleep when there is nothing new
+        :param flush_after: yield the pending record after this many idle
+        seconds, None to keep it until the next head
+        :param timeout: stop after this many idle seconds, None to follow
+        forever
+        :param batch_size: the records read at most before they are yielded
+        and the checkpoint saved, so catching up on a large file holds one
+        batch at once
+        """
+        if not self.using_file or self.compression:
+            raise TypeError('Only a plain log file can be followed.')
+        encoding = self.encoding or locale.getpreferredencoding(False)
+        log_file = open(self.path, 'rb')
+        inode = os.fstat(log_file.fileno()).st_ino
+        if self.builders is None:
+            self._init_builders()
+        stamp = self._stamper()
+        offset = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            if saved['inode'] == inode and \
+                    saved['offset'] <= os.fstat(log_file.fileno()).st_size:
+                offset = saved['offset']
+                log_file.seek(offset)
+        # holds the record waiting for its end, and where it starts
+        assembler = self._assembler()
+        saved_offset = None
+        idle = 0.0
+
+        def feed(raw: bytes, records: list):
+            record = assembler.feed(raw.decode(encoding), offset)
+            if record is not None:
+                records.append(record)
+
+        def flush(records: list):
+            record = assembler.flush()
+            if record is not None:
+                records.append(record)
+
+        def save():
+            nonlocal saved_offset
+            resume = assembler.offset if assembler.pending is not None \
+                else offset
+            if checkpoint and resume != saved_offset:
+                _save_checkpoint(checkpoint, inode, resume)
+                saved_offset = resume
+
+        try:
+            while True:
+                records = []
+                while True:
+                    raw = log_file.readline()
+                    if not raw.endswith(b'\n'):
+                        log_file.seek(offset)
+                        break
+                    feed(raw, records)
+                    offset += len(raw)
+                    if len(records) >= batch_size:
+                        break
+                if records:
+                    idle = 0.0
+                    yield from self._parse_records(records, stamp)
+                    save()
+                    continue
+                try:
+                    stat = os.stat(self.path)
+                except FileNotFoundError:
+                    stat = None
+                if stat is not None and (stat.st_ino != inode or
+                                         stat.st_size < offset):
+                    if stat.st_ino != inode:
+                        # rotated, a last line may miss its line break
+                        raw = log_file.read()
+                        if raw:
+                            feed(raw, records)
+                            offset += len(raw)
+                        log_file.close()
+                        log_file = open(self.path, 'rb')
+                        inode = os.fstat(log_file.fileno()).st_ino
+                    else:
+                        log_file.seek(0)
+                    flush(records)
+                    offset = 0
+                    idle = 0.0
+                    yield from self._parse_records(records, stamp)
+                    save()
+                    continue
+                if assembler.pending is not None and \
+                        flush_after is not None and \
+                        idle >= flush_after:
+                    flush(records)
+                    yield from self._parse_records(records, stamp)
+                    save()
+                    continue
+                if timeout is not None and idle >= timeout:
+                    break
+                save()
+                time.sleep(interval)
+                idle += interval
+            records = []
+            flush(records)
+            yield from self._parse_records(records, stamp)
+            save()
+        finally:
+            log_file.close()
+
+    def readall_parallel(self, processes: int=None, chunks: int=None):
+        """
+        Parse the log file in a pool of `processes` workers, each working on
+        a byte range of the file, and return the log items in file order.
+        Readers over an iterable object or a compressed file, and readers
+        whose directives stamp the records in file order, like SystemdDate
+        given a year, fall back to readall().
+        :param processes: number of workers, defaults to the cpu count
+        :param chunks: number of byte ranges, defaults to 4 per worker
+        """
+        if not self.using_file or self.compression or \
+                self._stamper() is not None:
+            return self.readall()
+        import multiprocessing
+
+        processes = processes or multiprocessing.cpu_count()
+        ranges = self._split_ranges(chunks or processes * 4)
+        state = {field: getattr(self, field) for field in self.WORKER_FIELDS}
+        with multiprocessing.Pool(processes) as pool:
+            parts = pool.starmap(_parse_range,
+                                 [(self.path, state) + bounds
+                                  for bounds in ranges])
+        self.cache = [log_item for part in parts for log_item in part]
+        return self.cache
 
     def __del__(self):
         del self.cache
-        if self.using_file:
-            if self.file_bind:
-                self.file_bind.close()
-        if self.iter_log_bind:
-            self.iter_log_bind.close()
+        if self.file_bind:
+            self.file_bind.close()
+
 
+def _save_checkpoint(checkpoint: str, inode: int, offset: int):
+    """
+    Save the position of GeneralReader.follow, replacing the old one at once.
+    """
+    temp_path = '{}.{}.tmp'.format(checkpoint, os.getpid())
+    with open(temp_path, 'w') as checkpoint_file:
+        json.dump({'inode': inode, 'offset': offset}, checkpoint_file)
+    os.replace(temp_path, checkpoint)
+
+
+def _parse_range(path, state, start, end):
+    """
+    Worker of GeneralReader.readall_parallel, parse a byte range of the file.
+    """
+    reader = GeneralReader(path)
+    reader.__dict__.update(state)
+    reader.triads_dict = {key: (cls, arg) for key, cls, arg in reader.triads}
+    lines = reader._range_lines(start, end)
+    return list(reader._parse_records(reader._iter_records(lines)))
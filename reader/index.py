@@ -0,0 +1,180 @@
+# encoding=utf-8
+"""
+This module keeps a sparse index of a log file beside it, recording the
+byte offset and timestamp of every N-th record, so a reader can seek to
+the records of a time window instead of parsing from the beginning.
+"""
+
+import bisect
+import datetime
+import hashlib
+import json
+import locale
+import mmap
+import os
+import re
+
+INDEX_SUFFIX = '.lpidx'
+INDEX_VERSION = 1
+# bytes at the beginning of the file hashed to tell a new file from an old one
+HEAD_SIZE = 1024
+
+
+class SparseIndex(object):
+    """
+    A sparse (offset, timestamp) index of a log file, saved as JSON.
+    """
+
+    def __init__(self, path: str, digest: str, step: int=1000,
+                 index_path: str=None):
+        """
+        :param path: the path of the log file
+        :param digest: the pattern digest of the reader, see
+        GeneralReader.pattern_digest
+        :param step: index one record in every `step` records
+        :param index_path: where to keep the index, defaults to the log file's
+        path plus INDEX_SUFFIX
+        """
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self.digest = digest
+        self.step = step
+        self.size = 0
+        self.mtime = 0
+        self.head = None
+        # offset of the last record head scanned, where an update resumes
+        self.scanned = 0
+        # records counted since the last entry, before `scanned`
+        self.count = 0
+        self.offsets = []
+        self.timestamps = []
+
+    @classmethod
+    def open(cls, reader, step: int=1000, index_path: str=None):
+        """
+        Load the index of the reader's file, bring it up to date with the
+        file and save it.
+        """
+        index = cls(reader.path, reader.pattern_digest(), step, index_path)
+        index.load()
+        index.update(reader)
+        return index
+
+    def _head_digest(self) -> str:
+        with open(self.path, 'rb') as log_file:
+            return hashlib.sha1(log_file.read(HEAD_SIZE)).hexdigest()
+
+    def load(self):
+        """
+        Load the saved index, unless it is missing or made for another
+        pattern, step or file.
+        """
+        try:
+            with open(self.index_path) as index_file:
+                saved = json.load(index_file)
+        except (IOError, ValueError):
+            return
+        if saved.get('version') != INDEX_VERSION or \
+                saved.get('digest') != self.digest or \
+                saved.get('step') != self.step:
+            return
+        self.size = saved['size']
+        self.mtime = saved['mtime']
+        self.head = saved['head']
+        self.scanned = saved['scanned']
+        self.count = saved['count']
+        self.offsets = [offset for offset, _ in saved['entries']]
+        self.timestamps = [datetime.datetime.fromisoformat(timestamp)
+                           for _, timestamp in saved['entries']]
+
+    def save(self):
+        saved = {
+            'version': INDEX_VERSION, 'digest': self.digest,
+            'step': self.step, 'size': self.size, 'mtime': self.mtime,
+            'head': self.head, 'scanned': self.scanned, 'count': self.count,
+            'entries': [[offset, timestamp.isoformat()] for offset, timestamp
+                        in zip(self.offsets, self.timestamps)]}
+        temp_path = '{}.{}.tmp'.format(self.index_path, os.getpid())
+        with open(temp_path, 'w') as index_file:
+            json.dump(saved, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def reset(self):
+        self.scanned = 0
+        self.count = 0
+        self.offsets = []
+        self.timestamps = []
+
+    def update(self, reader):
+        """
+        Scan the part of the file not indexed yet and save the index.
+        A file that shrank or whose beginning changed is indexed again.
+        """
+        stat = os.stat(self.path)
+        if stat.st_size == self.size and stat.st_mtime == self.mtime:
+            return
+        head = self._head_digest()
+        # a stamper, like the one of a SystemdDate given a year, has to start
+        # at the first record
+        stamp = reader._stamper()
+        if stat.st_size < self.size or head != self.head or \
+                stamp is not None:
+            self.reset()
+        self.size, self.mtime, self.head = stat.st_size, stat.st_mtime, head
+        if stat.st_size > 0:
+            self._scan(reader, stamp)
+        self.save()
+
+    def _scan(self, reader, stamp=None):
+        if reader.builders is None:
+            reader._init_builders()
+        time_index = reader._timestamp_index()
+        if time_index is None:
+            raise ValueError('Cannot index {}, no timestamp is captured.'
+                             .format(self.path))
+        time_builder = reader.builders[time_index][1]
+        encoding = reader.encoding or locale.getpreferredencoding(False)
+        bytes_re = re.compile(b'(?m)^' + reader.regexp.encode(encoding))
+        count, scanned = self.count, self.scanned
+        with open(self.path, 'rb') as log_file:
+            with mmap.mmap(log_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapping:
+                for match in bytes_re.finditer(mapping, self.scanned):
+                    offset = match.start()
+                    if stamp is not None:
+                        segments = stamp([
+                            segment.decode(encoding)
+                            for segment in reader.segments(match)])
+                    if count % self.step == 0 and \
+                            (not self.offsets or self.offsets[-1] < offset):
+                        if stamp is None:
+                            segment = reader.segments(match)[time_index]\
+                                .decode(encoding)
+                        else:
+                            segment = segments[time_index]
+                        self.offsets.append(offset)
+                        self.timestamps.append(time_builder(segment))
+                    scanned = offset
+                    count += 1
+        # the last record may still grow, it is scanned again next time
+        if count > self.count:
+            count -= 1
+        self.count, self.scanned = count, scanned
+
+    def window(self, since=None, until=None) -> (int, int):
+        """
+        Returns the byte range [start, end) holding the heads of all records
+        within [since, until), assuming timestamps grow through the file.
+        `end` is None for the end of the file, which may have grown since
+        it was indexed.
+        """
+        start, end = 0, None
+        if since is not None:
+            position = bisect.bisect_left(self.timestamps, since) - 1
+            if position >= 0:
+                start = self.offsets[position]
+        if until is not None:
+            position = bisect.bisect_left(self.timestamps, until)
+            if position < len(self.offsets):
+                end = self.offsets[position]
+        return start, end
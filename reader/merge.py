@@ -0,0 +1,49 @@
+# encoding=utf-8
+"""
+This module merges the records of several readers, possibly of different
+log systems and patterns, into one stream in timestamp order.
+"""
+
+import heapq
+
+
+def timestamp_key(reader) -> str:
+    """
+    Returns the key of the first timestamp the reader captures.
+    """
+    index = reader._timestamp_index()
+    if index is None:
+        raise ValueError('{} captures no timestamp to merge on.'
+                         .format(type(reader).__name__))
+    return reader.triads[index][0]
+
+
+def merge(*readers, with_source: bool=False):
+    """
+    Yield the records of all readers in timestamp order.
+    Each reader is streamed and only its next record is held, so this
+    assumes the records of each reader are in timestamp order already.
+    Records with equal timestamps keep the order of the readers.
+    :param readers: the readers to merge, e.g. one per log file
+    :param with_source: if True, yield (index of the reader, record) pairs
+    """
+    heap = []
+    for index, reader in enumerate(readers):
+        key = timestamp_key(reader)
+        iterator = iter(reader)
+        for record in iterator:
+            heap.append((record[key], index, record, key, iterator))
+            break
+    heapq.heapify(heap)
+    while heap:
+        timestamp, index, record, key, iterator = heap[0]
+        if with_source:
+            yield index, record
+        else:
+            yield record
+        for record in iterator:
+            heapq.heapreplace(heap, (record[key], index, record, key,
+                                     iterator))
+            break
+        else:
+            heapq.heappop(heap)
@@ -1,8 +1,32 @@
 # encoding=utf-8
-from . import log4j
-from . import systemd
+import importlib
+from collections.abc import Mapping
 
-ROUTER = {
-    'log4j': log4j,
-    'systemd': systemd
-}
+
+class PatternRouter(Mapping):
+    """
+    Maps a logsys to its pattern module, importing the module on its first
+    use, so a reader only pays for the log system it reads.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.modules = dict()
+
+    def __getitem__(self, logsys):
+        module = self.modules.get(logsys)
+        if module is None:
+            if logsys not in self.names:
+                raise KeyError(logsys)
+            module = self.modules[logsys] = importlib.import_module(
+                '.' + logsys, __name__)
+        return module
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+ROUTER = PatternRouter(('log4j', 'systemd'))
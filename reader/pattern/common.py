@@ -2,18 +2,35 @@
 """
 This module provides common components to construct the pattern parser
 """
+import functools
+import re
 
 # # Constants
 
 ELIXIR = 'Elixir'
+# the patterns each pattern parser keeps the result of, least recently used
+# ones are dropped first
+PARSE_CACHE_SIZE = 128
+
+
+def group_name(key: str) -> str:
+    """
+    Map a triad key like 'logger.namespace' to a valid group name.
+    """
+    return key.replace('.', '_')
 
 
 class ParserStatus(object):
-    def __init__(self):
+    def __init__(self, keys=None):
+        # the keys to capture, None for all
+        self.keys = keys
         self.string_buffer = []
         self.prefix_buffer = []
         self.suffix_buffer = []
         self.nearby_key = None
+        # the pattern as literal strings and (cls, prefix, suffix, capture)
+        # directives, see split_source
+        self.layout = []
 
     def set_nearby_directive(self, key):
         self.nearby_key = key
@@ -25,6 +42,19 @@ class ParserStatus(object):
     def push_char(self, char: str):
         self.string_buffer.append(char)
 
+    def push_literal(self, char: str):
+        """
+        Push a literal character of the pattern, escaped for the regexp.
+        """
+        self.string_buffer.append(re.escape(char))
+        if self.layout and isinstance(self.layout[-1], str):
+            self.layout[-1] += char
+        else:
+            self.layout.append(char)
+
+    def push_directive(self, cls, prefix, suffix, capture: bool):
+        self.layout.append((cls, prefix, suffix, capture))
+
     def push_suffix(self, opt: str):
         self.suffix_buffer.append(opt)
 
@@ -46,6 +76,12 @@ class ParserStatus(object):
         self.suffix_buffer.clear()
         return s
 
+    def capture(self, cls) -> bool:
+        """
+        Whether the directive `cls` should be captured.
+        """
+        return cls.CAPTURE and (self.keys is None or cls.KEY in self.keys)
+
     def pop_3(self):
         prefix = self.pop_prefix()
         directive = self.pop_nearby_directive()
@@ -62,25 +98,40 @@ class GeneralDirective:
     NEED_BUILD = False
     # The key for the output dict
     KEY = 'GENERAL'
+    # The numpy dtype of this directive's column in readall_columns
+    COLUMN_TYPE = 'object'
+    # Whether this directive builds the timestamp of a record
+    TIMESTAMP = False
+    # Whether this directive has a segment to capture
+    CAPTURE = True
+    # A regexp of one character, which all characters of a segment match.
+    # If set, a split parser cuts the segment at the next literal which
+    # does not start with such a character, see split_source
+    SPLIT_CHARS = None
 
     @classmethod
-    def regexp(cls, prefix: str, suffix: str, named=False, lang=None) -> str:
+    def regexp(cls, prefix: str, suffix: str, named=False, lang=None,
+               capture=True) -> str:
         """
         Generate a regexp to capture this segment from the log line.
         if `named` is True, this function will return a regexp using
         name group.
         if `lang` is None for Python, or, which is still planning, 'Elixir'
+        if `capture` is False, the segment is matched by a non-capturing
+        group instead.
         This function is just a wrapper, it calls the gen_regexp to make
         the pattern and format it as `named` and `lang` says.
         """
         basic_re = cls.gen_regexp(prefix, suffix, named, lang)
+        if not capture:
+            return '(?:{})'.format(basic_re) if basic_re else ''
         if not named:
             return '({})'.format(basic_re)
         else:
             if lang is None:
-                return '(?P<{}>{})'.format(cls.KEY, basic_re)
+                return '(?P<{}>{})'.format(group_name(cls.KEY), basic_re)
             elif lang == ELIXIR:
-                return '(?<{}>{})'.format(cls.KEY, basic_re)
+                return '(?<{}>{})'.format(group_name(cls.KEY), basic_re)
 
 
     @classmethod
@@ -99,6 +150,27 @@ class GeneralDirective:
         """
         return segment
 
+    @classmethod
+    def builder(cls, reader, *args) -> callable:
+        """
+        Provide the function a reader calls to build each segment.
+        Override this if building needs to know the reader, or keeps state
+        between the records of a reader.
+        """
+        return lambda segment: cls.build(segment, *args)
+
+    @classmethod
+    def stamper(cls, reader, *args):
+        """
+        Provide the function a reader calls on the segment of every record,
+        in file order, before building it, or None if there is none.
+        Override this if building a segment depends on the records before
+        it: the stamper keeps that state and returns the segment with what
+        the builder needs, so records can still be built in any order.
+        A reader makes a fresh stamper on each pass over the file.
+        """
+        return None
+
     @classmethod
     def additional_info(cls, prefix: str, suffix: str) -> tuple:
         """
@@ -108,13 +180,151 @@ class GeneralDirective:
         return tuple()
 
 
+SPLIT_NAME = 'split_record'
+# compiled split parsers, keyed by source
+SPLITTERS = dict()
+
+
+def split_source(layout: list) -> str:
+    """
+    Generate the source of a split parser, a function cutting the segments
+    of the captured directives out of a record with str.find and slicing,
+    the same segments the regexp would capture.
+    Directives are cut at the next literal if their SPLIT_CHARS allow,
+    validated with their own regexp, or else matched by their own regexp
+    where they start. The function returns None for a record it cannot
+    split, which is then left to the regexp.
+    :param layout: the layout of ParserStatus
+    :return: the source, or None if the pattern cannot be split
+    """
+    items = []
+    for item in layout:
+        if isinstance(item, str):
+            if items and isinstance(items[-1], str):
+                items[-1] += item
+            else:
+                items.append(item)
+            continue
+        cls, prefix, suffix, capture = item
+        regexp = cls.gen_regexp(prefix, suffix)
+        if regexp is None:
+            return None
+        # directives like a line separator match nothing
+        if regexp:
+            items.append((cls, regexp, capture))
+    head = ['import re', '']
+    body = ['def {}(record):'.format(SPLIT_NAME),
+            '    eol = record.find(\'\\n\')',
+            '    if eol < 0:',
+            '        eol = len(record)',
+            '    pos = 0']
+    segments = []
+    index = 0
+    while index < len(items):
+        item = items[index]
+        if isinstance(item, str):
+            body += ['    if not record.startswith({!r}, pos):'.format(item),
+                     '        return None',
+                     '    pos += {}'.format(len(item))]
+            index += 1
+            continue
+        cls, regexp, capture = item
+        segment = 'segment_{}'.format(index)
+        following = items[index + 1] if index + 1 < len(items) else None
+        literal = following if isinstance(following, str) else None
+        if regexp == '.*':
+            # the rest of the line, the regexp would backtrack if anything
+            # followed
+            if following is not None:
+                return None
+            if capture:
+                body.append('    {} = record[pos:eol]'.format(segment))
+                segments.append(segment)
+            index += 1
+        elif regexp == '.*?' or (cls.SPLIT_CHARS and literal and
+                                 not re.match(cls.SPLIT_CHARS, literal[0])):
+            if literal is None:
+                return None
+            body += ['    end = record.find({!r}, pos, eol)'.format(literal),
+                     '    if end < 0:',
+                     '        return None']
+            if regexp != '.*?':
+                head.append('check_{} = re.compile({!r}).fullmatch'
+                            .format(index, regexp))
+                body += ['    if not check_{}(record, pos, end):'
+                         .format(index),
+                         '        return None']
+            if capture:
+                body.append('    {} = record[pos:end]'.format(segment))
+                segments.append(segment)
+            body.append('    pos = end + {}'.format(len(literal)))
+            index += 2
+        else:
+            head.append('match_{} = re.compile({!r}).match'
+                        .format(index, regexp))
+            body += ['    match = match_{}(record, pos, eol)'.format(index),
+                     '    if match is None:',
+                     '        return None']
+            if capture:
+                body.append('    {} = match.group()'.format(segment))
+                segments.append(segment)
+            body.append('    pos = match.end()')
+            index += 1
+    body.append('    return [{}]'.format(', '.join(segments)))
+    return '\n'.join(head + [''] + body) + '\n'
+
+
+def head_regexp(layout: list) -> str:
+    """
+    Generate a regexp matching only the head of a record: the leading
+    literal, the first directive, usually the date, and the literal after
+    it. It is cheaper than the full regexp to tell a record head from a
+    continuation line.
+    Every line the full regexp matches is matched by this one too.
+    :param layout: the layout of ParserStatus
+    """
+    pieces = []
+    directive = None
+    for item in layout:
+        if isinstance(item, str):
+            pieces.append(re.escape(item))
+            if directive is not None:
+                break
+            continue
+        cls, prefix, suffix, capture = item
+        regexp = cls.gen_regexp(prefix, suffix)
+        # directives like a line separator match nothing
+        if not regexp:
+            continue
+        if directive is not None:
+            break
+        directive = regexp
+        pieces.append('(?:{})'.format(regexp))
+    return ''.join(pieces)
+
+
+def compile_splitter(source: str) -> callable:
+    """
+    Returns the split parser of a source made by split_source.
+    """
+    splitter = SPLITTERS.get(source)
+    if splitter is None:
+        namespace = dict()
+        exec(source, namespace)
+        splitter = SPLITTERS[source] = namespace[SPLIT_NAME]
+    return splitter
+
+
 def gen_pattern_parser(start_function: callable,
                        cleanup_function: callable,
                        regexp_only: bool=False,
                        named=True,
-                       lang=None):
-    def pattern_parser(pattern: str):
-        status = ParserStatus()
+                       lang=None,
+                       split_only: bool=False,
+                       head_only: bool=False):
+    @functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+    def parse(pattern: str, keys: frozenset):
+        status = ParserStatus(keys)
         re_pieces = []
         build_triads = []
         function = start_function
@@ -126,7 +336,8 @@ def gen_pattern_parser(start_function: callable,
             elif isinstance(retval, tuple) and len(retval) == 2:
                 regexp_piece, build_triad = retval
                 re_pieces.append(regexp_piece)
-                build_triads.append(build_triad)
+                if build_triad is not None:
+                    build_triads.append(build_triad)
             elif retval is None:
                 continue
             else:
@@ -138,12 +349,38 @@ def gen_pattern_parser(start_function: callable,
             re_pieces.append(remaining_reg)
         if remaining_tri:
             build_triads.append(remaining_tri)
+        if split_only:
+            return split_source(status.layout)
+        if head_only:
+            return head_regexp(status.layout)
         regexp = ''.join(re_pieces)
+        # a trailing message no one captures needs no match at all
+        if keys is not None and regexp.endswith('(?:.*)'):
+            regexp = regexp[:-len('(?:.*)')]
         if regexp_only:
             return regexp
         else:
-            return regexp, build_triads
+            return regexp, tuple(build_triads)
+
+    def pattern_parser(pattern: str, keys=None):
+        """
+        Parse the pattern into a regexp and the build triads, into the
+        source of a split parser if split_only, or into the regexp of record
+        heads if head_only.
+        Results are memoized, see PARSE_CACHE_SIZE.
+        :param keys: if given, only directives whose KEY is in keys are
+        captured and have a triad.
+        """
+        if keys is not None:
+            keys = frozenset(keys)
+        result = parse(pattern, keys)
+        if isinstance(result, tuple):
+            # a fresh list, callers may change their triads
+            return result[0], list(result[1])
+        return result
 
+    pattern_parser.cache_info = parse.cache_info
+    pattern_parser.cache_clear = parse.cache_clear
     return pattern_parser
 
 
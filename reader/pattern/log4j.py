@@ -16,21 +16,25 @@ DEFAULT_CONVERSION_PATTERN = "%m%n"
 TTCC_CONVERSION_PATTERN = "%r [%t] %p %c %x - %m%n"
 SIMPLE_CONVERSION_PATTERN = "%d [%t] %p %c - %m%n"
 ROUTER = dict()
-DEFAULT_DATE_PATTERN = ''
+DEFAULT_DATE_PATTERN = 'ISO8601'
 
 # ############### Functions to complete the pattern reader ################
 
 
 def make_directive(prefix: str, directive: str, suffix: str,
-                   named=True, lang=None):
+                   named=True, lang=None, capture=True):
     cls = ROUTER.get(directive, None)
     if not cls:
         raise ValueError(
             'Pattern %{}{}{} does not exists or not implemented yet.'
             .format(prefix, directive, suffix))
     else:
-        regexp_piece = cls.regexp(prefix, suffix, named=named, lang=lang)
-        if cls.NEED_BUILD:
+        capture = capture and cls.CAPTURE
+        regexp_piece = cls.regexp(prefix, suffix, named=named, lang=lang,
+                                  capture=capture)
+        if not capture:
+            build_triad = None
+        elif cls.NEED_BUILD:
             build_triad = (cls.KEY, cls,
                            cls.additional_info(prefix, suffix))
         else:
@@ -38,12 +42,23 @@ def make_directive(prefix: str, directive: str, suffix: str,
     return regexp_piece, build_triad
 
 
+def pop_directive(status: ParserStatus, named=True, lang=None):
+    """
+    Make the pending directive of status, and record it in its layout.
+    """
+    capture = status.capture(ROUTER[status.nearby_key])
+    prefix, directive, suffix = status.pop_3()
+    status.push_directive(ROUTER[directive], prefix, suffix, capture)
+    return make_directive(prefix, directive, suffix, named=named, lang=lang,
+                          capture=capture)
+
+
 def read(current_char: str, status: ParserStatus,
          named=True, lang=None):
     if current_char == '%':
         return status.pop_string(), read_present
     else:
-        status.push_char(re.escape(current_char))
+        status.push_literal(current_char)
         return None, read
 
 
@@ -52,8 +67,8 @@ def read_pending(current_char: str, status: ParserStatus,
     if current_char == '{':
         return None, read_braces
     else:
-        re_piece, build_triad = make_directive(*status.pop_3(), named=named,
-                                               lang=lang)
+        re_piece, build_triad = pop_directive(status, named=named,
+                                              lang=lang)
         retval, next_func = read(current_char, status, named=named, lang=lang)
         if isinstance(retval, str):
             return (re_piece + retval, build_triad), next_func
@@ -67,8 +82,7 @@ def read_pending(current_char: str, status: ParserStatus,
 def read_braces(current_char: str, status: ParserStatus,
                 named=True, lang=None):
     if current_char == '}':
-        t, a = make_directive(*status.pop_3(), named=named, lang=lang), read
-        return t, a
+        return pop_directive(status, named=named, lang=lang), read
     else:
         status.push_suffix(current_char)
         return None, read_braces
@@ -77,7 +91,8 @@ def read_braces(current_char: str, status: ParserStatus,
 def read_present(current_char: str, status: ParserStatus,
                  named=True, lang=None):
     if current_char == '%':
-        return '%', read
+        status.push_literal('%')
+        return None, read
     elif current_char in ROUTER:
         status.set_nearby_directive(current_char)
         return None, read_pending
@@ -92,8 +107,7 @@ def clean(status: ParserStatus, named=True, lang=None):
     if status.string_buffer:
         return status.pop_string(), ()
     if status.nearby_key:
-        t, a = make_directive(*status.pop_3(), named=named, lang=lang)
-        return t, a
+        return pop_directive(status, named=named, lang=lang)
 
 
 # ############### Classes to handle the directives ################
@@ -106,6 +120,8 @@ class Log4jDate(GeneralDirective):
     DIRECTIVE = 'd'
     NEED_BUILD = True
     KEY = 'date'
+    COLUMN_TYPE = 'datetime64[us]'
+    TIMESTAMP = True
 
     DATE_DIRECTIVES = {
         'y': ('%Y', '\d'),
@@ -117,6 +133,19 @@ class Log4jDate(GeneralDirective):
         'S': ('%f', '\d'),
     }
 
+    # widths of the strptime directives a compiled parser can slice out,
+    # '%f' is taken as milliseconds as log4j's SSS writes
+    FIELD_WIDTHS = {'%Y': 4, '%m': 2, '%d': 2, '%H': 2, '%M': 2, '%S': 2,
+                    '%b': 3, '%f': 3}
+    MON_NAMES = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+                 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+    # the bound of each parser's memo of recent seconds
+    MEMO_SIZE = 256
+    # compiled parsers, keyed by format string
+    PARSERS = dict()
+    # results of parse_suffix, keyed by suffix
+    SUFFIXES = dict()
+
     BUILTIN = {
         'ABSOLUTE': ('%H:%M:%S.%f',
                      r'\d{2}:\d{2}:\d{2}.\d{3}'),
@@ -132,12 +161,12 @@ class Log4jDate(GeneralDirective):
             raise SyntaxError(
                 'Cannot parse %{}d{{{}}}: no prefixing options excepted'
                 .format(prefix, suffix))
-        if suffix in Log4jDate.BUILTIN:
-            return Log4jDate.BUILTIN[suffix][1]
         if not suffix:
             suffix = DEFAULT_DATE_PATTERN
+        if suffix in Log4jDate.BUILTIN:
+            return Log4jDate.BUILTIN[suffix][1]
         date_format, date_re = Log4jDate.parse_suffix(suffix)
-        return '({})'.format(date_re)
+        return date_re
 
     @classmethod
     def time_format(cls, prefix: str, suffix: str) -> str:
@@ -145,10 +174,10 @@ class Log4jDate(GeneralDirective):
             raise SyntaxError(
                 'Cannot parse %{}d{{{}}}: no prefixing options excepted'
                 .format(prefix, suffix))
-        if suffix in Log4jDate.BUILTIN:
-            return Log4jDate.BUILTIN[suffix][0]
         if not suffix:
             suffix = DEFAULT_DATE_PATTERN
+        if suffix in Log4jDate.BUILTIN:
+            return Log4jDate.BUILTIN[suffix][0]
         date_format, date_re = Log4jDate.parse_suffix(suffix)
         return date_format
 
@@ -161,6 +190,13 @@ class Log4jDate(GeneralDirective):
         :param suffix: suffix for %d
         :return: a format string and a regexp.
         """
+        parsed = cls.SUFFIXES.get(suffix)
+        if parsed is None:
+            parsed = cls.SUFFIXES[suffix] = cls._parse_suffix(suffix)
+        return parsed
+
+    @classmethod
+    def _parse_suffix(cls, suffix: str) -> (str, str):
         last_directive = None
         last_directive_count = 1
         format_pieces = []
@@ -192,12 +228,97 @@ class Log4jDate(GeneralDirective):
 
     @classmethod
     def build(cls, segment: str, format_str: str) -> datetime.datetime:
-        return datetime.datetime.strptime(segment, format_str)
+        parser = cls.PARSERS.get(format_str)
+        if parser is None:
+            parser = cls.PARSERS[format_str] = cls.compile_parser(format_str)
+        return parser(segment)
+
+    @classmethod
+    def builder(cls, reader, format_str: str) -> callable:
+        parser = cls.PARSERS.get(format_str)
+        if parser is None:
+            parser = cls.PARSERS[format_str] = cls.compile_parser(format_str)
+        return parser
+
+    @classmethod
+    def compile_parser(cls, format_str: str) -> callable:
+        """
+        Generate a parser specialized for `format_str`, which slices the
+        fixed-width fields out of a segment and converts them to ints.
+        The datetime of recent seconds is memoized, so records within the
+        same second only convert their fraction.
+        Segments the slices do not fit fall back to datetime.strptime.
+        :param format_str: a format string made by time_format
+        :return: a function taking the segment and returning a datetime
+        """
+        def fallback(segment):
+            return datetime.datetime.strptime(segment, format_str)
+
+        fields = dict()
+        fraction = None
+        width = 0
+        pieces = iter(re.split('(%.)', format_str))
+        for piece in pieces:
+            if piece.startswith('%'):
+                if piece not in cls.FIELD_WIDTHS or piece[1] in fields:
+                    return fallback
+                span = (width, width + cls.FIELD_WIDTHS[piece])
+                if piece == '%f':
+                    fraction = span
+                else:
+                    fields[piece[1]] = span
+                width = span[1]
+            else:
+                width += len(piece)
+        if not fields:
+            return fallback
+
+        def field(key, default):
+            if key not in fields:
+                return default
+            start, end = fields[key]
+            if key == 'b':
+                return 'months[segment[{}:{}]]'.format(start, end)
+            return 'int(segment[{}:{}])'.format(start, end)
+
+        if fraction is None:
+            prefix = 'segment'
+        elif fraction[1] == width:
+            prefix = 'segment[:{}]'.format(fraction[0])
+        else:
+            prefix = 'segment[:{}] + segment[{}:]'.format(*fraction)
+        lines = [
+            'def parse(segment):',
+            '    if len(segment) != {}:'.format(width),
+            '        return fallback(segment)',
+            '    prefix = {}'.format(prefix),
+            '    base = memo.get(prefix)',
+            '    if base is None:',
+            '        try:',
+            '            base = datetime({}, {}, {}, {}, {}, {})'.format(
+                field('Y', 1900), field('m', field('b', 1)), field('d', 1),
+                field('H', 0), field('M', 0), field('S', 0)),
+            '        except (KeyError, ValueError):',
+            '            return fallback(segment)',
+            '        if len(memo) >= {}:'.format(cls.MEMO_SIZE),
+            '            memo.clear()',
+            '        memo[prefix] = base',
+        ]
+        if fraction is None:
+            lines.append('    return base')
+        else:
+            lines.append('    return base.replace(microsecond=int('
+                         'segment[{}:{}]) * 1000)'.format(*fraction))
+        namespace = {'datetime': datetime.datetime, 'months': cls.MON_NAMES,
+                     'memo': dict(), 'fallback': fallback}
+        exec('\n'.join(lines), namespace)
+        return namespace['parse']
 
 
 class Log4jLoggerNamespace(GeneralDirective):
     DIRECTIVE = 'c'
     KEY = 'logger.namespace'
+    SPLIT_CHARS = r'[.\w]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -208,6 +329,7 @@ class Log4jLoggerNamespace(GeneralDirective):
 class Log4jLoggerClassName(GeneralDirective):
     DIRECTIVE = 'C'
     KEY = 'logger.class'
+    SPLIT_CHARS = r'[.\w]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -218,6 +340,7 @@ class Log4jLoggerClassName(GeneralDirective):
 class Log4jSourceFile(GeneralDirective):
     DIRECTIVE = 'F'
     KEY = 'source.file'
+    SPLIT_CHARS = r'[.\w]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -228,6 +351,7 @@ class Log4jSourceFile(GeneralDirective):
 class Log4jCallerPosition(GeneralDirective):
     DIRECTIVE = 'l'
     KEY = 'caller.position'
+    SPLIT_CHARS = r'\d'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -238,7 +362,9 @@ class Log4jCallerPosition(GeneralDirective):
 class Log4jCallerLineNumber(GeneralDirective):
     DIRECTIVE = 'L'
     KEY = 'caller.lineno'
+    SPLIT_CHARS = r'\d'
     NEED_BUILD = True
+    COLUMN_TYPE = 'int64'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -263,6 +389,7 @@ class Log4jMessage(GeneralDirective):
 class Log4jCallerMethodName(GeneralDirective):
     DIRECTIVE = 'M'
     KEY = 'caller.method'
+    SPLIT_CHARS = r'[.\w]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -273,17 +400,21 @@ class Log4jCallerMethodName(GeneralDirective):
 class Log4jLogLevel(GeneralDirective):
     DIRECTIVE = 'p'
     KEY = 'level'
+    SPLIT_CHARS = r'[A-Z]'
+    LEVELS = ('DEBUG', 'INFO', 'WARN', 'ERROR', 'FATAL')
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
                    lang=None) -> str:
-        return "DEBUG|INFO|WARN|ERROR|FATAL"
+        return '|'.join(cls.LEVELS)
 
 
 class Log4jRuntimeMillisecond(GeneralDirective):
     DIRECTIVE = 'r'
     KEY = 'runtime'
+    SPLIT_CHARS = r'\d'
     NEED_BUILD = True
+    COLUMN_TYPE = 'int64'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -298,6 +429,7 @@ class Log4jRuntimeMillisecond(GeneralDirective):
 class Log4jCallerThreadName(GeneralDirective):
     DIRECTIVE = 't'
     KEY = 'caller.thread'
+    SPLIT_CHARS = r'[.\w]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -309,6 +441,25 @@ class Log4jNDC(GeneralDirective):
     DIRECTIVE = 'x'
     KEY = 'ndc'
 
+    @classmethod
+    def gen_regexp(cls, prefix: str, suffix: str, named=False,
+                   lang=None) -> str:
+        return r'.*?'
+
+
+class Log4jLineSeparator(GeneralDirective):
+    """
+    Handle %n, the end of a record, which has nothing to capture.
+    """
+    DIRECTIVE = 'n'
+    KEY = 'newline'
+    CAPTURE = False
+
+    @classmethod
+    def gen_regexp(cls, prefix: str, suffix: str, named=False,
+                   lang=None) -> str:
+        return ''
+
 
 class Log4jMDC(GeneralDirective):
     DIRECTIVE = 'X'
@@ -318,4 +469,6 @@ class Log4jMDC(GeneralDirective):
 make_router(__name__, ROUTER)
 # ############## MAKE PARSER ################
 parser = gen_pattern_parser(read, clean)
+split_parser = gen_pattern_parser(read, clean, split_only=True)
+head_parser = gen_pattern_parser(read, clean, head_only=True)
 test_parser = gen_pattern_parser(read, clean, regexp_only=True)
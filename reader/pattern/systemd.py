@@ -6,9 +6,9 @@ This module DOSE NOT PROVIDE SERIOUS TOOLS to build a systemd's log reader,
 instant, this more likely a MODULE TO TEST THE READER.
 """
 
+import calendar
 import datetime
-import multiprocessing
-import re
+import os.path
 
 from .common import ParserStatus, GeneralDirective
 from .common import gen_pattern_parser, make_router
@@ -25,7 +25,7 @@ def read(c: str, status: ParserStatus,
     if c == '%':
         return status.pop_string(), read_present
     else:
-        status.push_char(re.escape(c))
+        status.push_literal(c)
         return None, read
 
 
@@ -33,7 +33,12 @@ def read_present(c: str, status: ParserStatus,
                  named=True, lang=None):
     if c in ROUTER:
         cls = ROUTER[c]
-        regexp = cls.regexp(None, None, named=named, lang=lang)
+        capture = status.capture(cls)
+        status.push_directive(cls, None, None, capture)
+        regexp = cls.regexp(None, None, named=named, lang=lang,
+                            capture=capture)
+        if not capture:
+            return regexp, read
         triad = (cls.KEY, cls, cls.additional_info(None, None))
         return (regexp, triad), read
 
@@ -52,6 +57,8 @@ class SystemdDate(GeneralDirective):
     DIRECTIVE = 'd'
     NEED_BUILD = True
     KEY = 'datetime'
+    COLUMN_TYPE = 'datetime64[us]'
+    TIMESTAMP = True
     MON_NAMES = {'Jan': 1, 'Feb': 2, 'Mar': 3, "Apr": 4, 'May': 5, 'Jun': 6,
                  'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
 
@@ -64,19 +71,93 @@ class SystemdDate(GeneralDirective):
     def additional_info(cls, prefix: str, suffix: str):
         return '%b %d %H:%M:%S',
 
+    # the bound of each builder's memo of recent minutes
+    MEMO_SIZE = 256
+
     @classmethod
     def build(cls, segment: str, format_str: str) -> datetime.datetime:
-        mon, day, c = segment.split()
-        mon = cls.MON_NAMES[mon]
-        hour, minutes, s = c.split(':')
-        return datetime.datetime(2014, mon, int(day),
-                                 int(hour), int(minutes), int(s))
+        return cls.builder(None, format_str)(segment)
+
+    @classmethod
+    def stamper(cls, reader, format_str: str):
+        """
+        If the reader gives a year, it is the year of the first record and
+        increases each time the month goes back, like December to January.
+        The year is put before the segment, like '2016 Jan 01 00:00:01'.
+        """
+        year = getattr(reader, 'year', None)
+        if year is None:
+            return None
+        # the year and month of the last record
+        state = [year, 0]
+        months = cls.MON_NAMES
+
+        def stamp(segment: str) -> str:
+            current, last_month = state
+            month = months[segment[:3]]
+            if month < last_month:
+                current += 1
+            state[:] = current, month
+            return '{} {}'.format(current, segment)
+
+        return stamp
+
+    @classmethod
+    def builder(cls, reader, format_str: str) -> callable:
+        """
+        Make a builder inferring the year the timestamps omit.
+        If the reader gives a year, the segments carry the year of stamper.
+        Otherwise a record belongs to the latest year that does not place it
+        more than a day after the file's mtime, or now for iterables; a
+        Feb 29 belongs to the latest leap year before.
+        The datetime of recent minutes is memoized, so records within the
+        same minute only convert their seconds.
+        """
+        stamped = getattr(reader, 'year', None) is not None
+        if not stamped:
+            if reader is not None and reader.using_file and \
+                    os.path.exists(reader.path):
+                reference = datetime.datetime.fromtimestamp(
+                    os.path.getmtime(reader.path))
+            else:
+                reference = datetime.datetime.now()
+            reference += datetime.timedelta(days=1)
+            latest = (reference.month, reference.day)
+        # where the month starts, after the year of a stamped segment
+        offset = 5 if stamped else 0
+        memo = dict()
+        months = cls.MON_NAMES
+
+        def build(segment: str) -> datetime.datetime:
+            prefix = segment[:offset + 12]
+            base = memo.get(prefix)
+            if base is None:
+                date = segment[offset:]
+                month, day = months[date[:3]], int(date[4:6])
+                if stamped:
+                    current = int(segment[:4])
+                else:
+                    current = reference.year
+                    if (month, day) > latest:
+                        current -= 1
+                    if (month, day) == (2, 29):
+                        while not calendar.isleap(current):
+                            current -= 1
+                base = datetime.datetime(current, month, day,
+                                         int(date[7:9]), int(date[10:12]))
+                if len(memo) >= cls.MEMO_SIZE:
+                    memo.clear()
+                memo[prefix] = base
+            return base.replace(second=int(segment[offset + 13:offset + 15]))
+
+        return build
 
 
 class SystemdHostname(GeneralDirective):
     DIRECTIVE = 'h'
     NEED_BUILD = False
     KEY = 'hostname'
+    SPLIT_CHARS = r'\w'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -88,6 +169,7 @@ class SystemdSource(GeneralDirective):
     DIRECTIVE = 's'
     NEED_BUILD = True
     KEY = 'source'
+    SPLIT_CHARS = r'[.\-\w\[\]]'
 
     @classmethod
     def gen_regexp(cls, prefix: str, suffix: str, named=False,
@@ -122,4 +204,6 @@ make_router(__name__, ROUTER)
 # ############## MAKE PARSER ################
 
 parser = gen_pattern_parser(read, clean)
+split_parser = gen_pattern_parser(read, clean, split_only=True)
+head_parser = gen_pattern_parser(read, clean, head_only=True)
 test_parser = gen_pattern_parser(read, clean, regexp_only=True)
@@ -0,0 +1,187 @@
+# encoding=utf-8
+"""
+This module estimates the distinct values and the most frequent values of
+record fields, like the distinct threads or the busiest loggers of a log,
+in a fixed memory independent of the log size.
+Sketches of the same shape, fed by separate files or workers, merge into
+the sketch of all their records.
+"""
+
+import array
+import hashlib
+import heapq
+import math
+
+from .aggregate import make_getter
+from .generic import GeneralReader
+
+
+def hash64(value) -> int:
+    """
+    A 64-bit hash of a value, stable across processes, unlike hash() of str.
+    """
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8') if isinstance(value, str) \
+            else repr(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(),
+                          'little')
+
+
+class HyperLogLog(object):
+    """
+    Estimates the number of distinct values added, with a standard error of
+    about 1.04 / sqrt(2 ** precision), in 2 ** precision bytes.
+    """
+
+    def __init__(self, precision: int=12):
+        """
+        :param precision: bits of the hash choosing the register, 4 to 18
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError('Precision should be within 4 and 18.')
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        hashed = hash64(value)
+        index = hashed & ((1 << self.precision) - 1)
+        rest = hashed >> self.precision
+        # the position of the lowest set bit of the rest, 1-based
+        rank = (rest & -rest).bit_length() if rest else \
+            64 - self.precision + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size) if size >= 128 else \
+            {16: 0.673, 32: 0.697, 64: 0.709}[size]
+        estimate = alpha * size * size / sum(
+            2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # linear counting is better for few values
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """
+        Fold in the values added to another sketch of the same precision.
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precisions.')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+
+class CountMinSketch(object):
+    """
+    Estimates how many times each value was added, never below the real
+    count and above it by at most about e / width of all the adds, in
+    width * depth counters; and keeps the `k` values counted most.
+    """
+
+    def __init__(self, width: int=2048, depth: int=4, k: int=10):
+        """
+        :param width: the counters of a row
+        :param depth: the rows, each hashing the values differently
+        :param k: the heavy hitters to keep
+        """
+        if width < 1 or depth < 1 or k < 0:
+            raise ValueError(
+                'Width and depth should be positive, k not negative.')
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.rows = [array.array('q', bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+        # value -> estimated count of the heavy hitters
+        self.heavy = dict()
+
+    def _columns(self, value) -> list:
+        hashed = hash64(value)
+        low, high = hashed & 0xffffffff, (hashed >> 32) | 1
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, value, count: int=1):
+        estimate = None
+        for row, column in zip(self.rows, self._columns(value)):
+            row[column] += count
+            if estimate is None or row[column] < estimate:
+                estimate = row[column]
+        self.total += count
+        self._offer(value, estimate)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def _offer(self, value, estimate: int):
+        heavy = self.heavy
+        if value in heavy or len(heavy) < self.k:
+            heavy[value] = estimate
+            return
+        if not heavy:
+            return
+        lightest = min(heavy, key=heavy.__getitem__)
+        if estimate > heavy[lightest]:
+            del heavy[lightest]
+            heavy[value] = estimate
+
+    def estimate(self, value) -> int:
+        return min(row[column]
+                   for row, column in zip(self.rows, self._columns(value)))
+
+    def top(self, n: int=None) -> list:
+        """
+        Returns the (value, estimated count) of the heavy hitters, most
+        counted first.
+        """
+        n = self.k if n is None else min(n, self.k)
+        return heapq.nlargest(n, self.heavy.items(), key=lambda item: item[1])
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """
+        Fold in the values added to another sketch of the same shape.
+        """
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Cannot merge sketches of different shapes.')
+        for row, other_row in zip(self.rows, other.rows):
+            for column, count in enumerate(other_row):
+                if count:
+                    row[column] += count
+        self.total += other.total
+        candidates = set(self.heavy) | set(other.heavy)
+        self.heavy = dict()
+        for value in candidates:
+            self._offer(value, self.estimate(value))
+        return self
+
+
+def sketch(records, sketches: dict, batch_size: int=4096) -> dict:
+    """
+    Feed the values of record fields to sketches.
+    A reader is read in batches, project it to the sketched keys to skip
+    building the other fields.
+    :param records: a reader, or any iterable of records
+    :param sketches: key -> the sketch of its values, like
+    {'caller.thread': HyperLogLog(), 'logger.class': CountMinSketch()}
+    :return: sketches
+    """
+    if isinstance(records, GeneralReader):
+        batches = records.read_batches(batch_size)
+    else:
+        batches = [records]
+    feeders = None
+    for batch in batches:
+        for record in batch:
+            if feeders is None:
+                feeders = [(make_getter(record, key), each.add)
+                           for key, each in sketches.items()]
+            for getter, add in feeders:
+                add(getter(record))
+    return sketches
@@ -0,0 +1,118 @@
+# encoding=utf-8
+"""
+This module gives out the per-stage counters and timers of a reader, see
+GeneralReader.enable_stats. Instrumentation works by wrapping the line
+source, the regexp matches and the builders of a reader, so a reader
+without stats runs exactly the code it ran before.
+"""
+
+import time
+
+
+class StageStats(object):
+    """
+    The counters of one stage: how many times it ran, how many of those
+    runs hit (a line read, a regexp matched), and the seconds spent.
+    """
+    __slots__ = ('calls', 'hits', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {'calls': self.calls, 'hits': self.hits,
+                'misses': self.calls - self.hits, 'seconds': self.seconds}
+
+
+class ReaderStats(object):
+    """
+    Counts and times each stage of a reader:
+    - read: the lines read from the source, and the time waiting for them
+    - head: the record-head matches, hits are record heads and misses are
+      continuation lines joined to the record before them
+    - split: the split parser, misses are the records left to the regexp
+    - match: the full regexp matches, misses are the unmatched records
+    - build: the builds of each directive class, like 'Log4jDate'
+    """
+
+    def __init__(self):
+        self.read = StageStats()
+        self.head = StageStats()
+        self.split = StageStats()
+        self.match = StageStats()
+        self.build = dict()
+
+    def wrap_lines(self, lines):
+        """
+        Count and time the lines taken from `lines`.
+        The wrapper closes `lines` when it is closed itself.
+        """
+        stage = self.read
+        clock = time.perf_counter
+        iterator = iter(lines)
+        try:
+            while True:
+                start = clock()
+                try:
+                    line = next(iterator)
+                except StopIteration:
+                    stage.seconds += clock() - start
+                    return
+                stage.seconds += clock() - start
+                stage.calls += 1
+                stage.hits += 1
+                yield line
+        finally:
+            if hasattr(lines, 'close'):
+                lines.close()
+
+    def wrap_match(self, stage: StageStats, match: callable) -> callable:
+        """
+        Count and time the calls of a regexp's match method.
+        """
+        clock = time.perf_counter
+
+        def timed_match(string):
+            start = clock()
+            result = match(string)
+            stage.seconds += clock() - start
+            stage.calls += 1
+            if result is not None:
+                stage.hits += 1
+            return result
+
+        return timed_match
+
+    def wrap_builder(self, name: str, builder: callable) -> callable:
+        """
+        Count and time the builds of the directive class named `name`.
+        """
+        stage = self.build.get(name)
+        if stage is None:
+            stage = self.build[name] = StageStats()
+        clock = time.perf_counter
+
+        def timed_builder(segment):
+            start = clock()
+            value = builder(segment)
+            stage.seconds += clock() - start
+            stage.calls += 1
+            stage.hits += 1
+            return value
+
+        return timed_builder
+
+    def as_dict(self) -> dict:
+        return {
+            'read': self.read.as_dict(),
+            'head': self.head.as_dict(),
+            'split': self.split.as_dict(),
+            'match': self.match.as_dict(),
+            'build': {name: stage.as_dict()
+                      for name, stage in self.build.items()},
+        }
+
+    def __repr__(self):
+        return 'ReaderStats({!r})'.format(self.as_dict())
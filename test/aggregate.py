@@ -0,0 +1,66 @@
+# encoding=utf-8
+
+import datetime
+from unittest import TestCase
+
+from reader.aggregate import OTHER, Aggregator, Bucket, aggregate
+from reader.generate import load_reader
+
+LINES = [
+    'Jan 02 03:04:00 arch kernel: a\n',
+    'Jan 02 03:04:20 arch sshd[1]: b\n',
+    'Jan 02 03:04:59 node sshd[2]: c\n',
+    'Jan 02 03:05:01 arch sshd[1]: d\n',
+    'Jan 02 03:07:30 arch kernel: e\n',
+]
+MINUTE = datetime.timedelta(minutes=1)
+
+
+def at(minute, second=0):
+    return datetime.datetime(2014, 1, 2, 3, minute, second)
+
+
+class AggregateTest(TestCase):
+    def setUp(self):
+        self.reader = load_reader('systemd', '%d %h %s: %m')(LINES)
+        self.reader.year = 2014
+
+    def test_aggregate(self):
+        buckets = list(aggregate(self.reader, ['source.pname'], MINUTE))
+        self.assertEqual([
+            Bucket(at(4), at(5), {('kernel',): 1, ('sshd',): 2}),
+            Bucket(at(5), at(6), {('sshd',): 1}),
+            Bucket(at(7), at(8), {('kernel',): 1}),
+        ], buckets)
+
+    def test_streaming(self):
+        aggregator = Aggregator(['hostname'], MINUTE, 'datetime')
+        records = list(self.reader)
+        self.assertEqual([], aggregator.add(records[0]))
+        self.assertEqual([], aggregator.add(records[2]))
+        finished = aggregator.add(records[3])
+        self.assertEqual([Bucket(at(4), at(5), {('arch',): 1, ('node',): 1})],
+                         finished)
+        # the bucket is given out, records for it are late
+        self.assertEqual([], aggregator.add(records[1]))
+        self.assertEqual(1, aggregator.late)
+        self.assertEqual([at(5)], [bucket.start
+                                   for bucket in aggregator.flush()])
+
+    def test_lateness(self):
+        aggregator = Aggregator(['hostname'], MINUTE, 'datetime',
+                                lateness=MINUTE)
+        records = list(self.reader)
+        for record in records[:1] + records[2:4] + records[1:2]:
+            self.assertEqual([], aggregator.add(record))
+        self.assertEqual(3, sum(aggregator.buckets[at(4)].values()))
+        finished = aggregator.add(records[4])
+        self.assertEqual([at(4), at(5)], [bucket.start for bucket in finished])
+
+    def test_max_groups(self):
+        records = [{'time': at(4, second), 'host': 'h{}'.format(second)}
+                   for second in range(10)]
+        buckets = list(aggregate(records, ['host'], MINUTE, timestamp='time',
+                                 max_groups=3))
+        self.assertEqual(4, len(buckets[0].counts))
+        self.assertEqual(7, buckets[0].counts[(OTHER,)])
@@ -0,0 +1,40 @@
+# encoding=utf-8
+
+import asyncio
+from unittest import TestCase
+
+from reader.aio import AsyncReader
+from test.generic import LINES, SampleReader
+
+
+class AsyncReaderTest(TestCase):
+    def test_readall(self):
+        async def read():
+            stream = asyncio.StreamReader()
+            stream.feed_data(''.join(LINES).encode('utf-8'))
+            stream.feed_eof()
+            return await AsyncReader(SampleReader([]), stream).readall()
+
+        self.assertEqual(SampleReader(LINES).readall(), asyncio.run(read()))
+
+    def test_flush_after(self):
+        async def read():
+            stream = asyncio.StreamReader()
+            stream.feed_data(LINES[0].encode('utf-8'))
+            records = AsyncReader(SampleReader([]), stream, flush_after=0.01)
+            # the stream stays open, the record is flushed after a pause
+            return await records.__aiter__().__anext__()
+
+        self.assertEqual('first', asyncio.run(read())['message'])
+
+    def test_stats(self):
+        reader = SampleReader([]).enable_stats()
+
+        async def read():
+            stream = asyncio.StreamReader()
+            stream.feed_data(''.join(LINES).encode('utf-8'))
+            stream.feed_eof()
+            return await AsyncReader(reader, stream).readall()
+
+        self.assertEqual(3, len(asyncio.run(read())))
+        self.assertEqual(3, reader.stats.as_dict()['match']['calls'])
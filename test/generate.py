@@ -0,0 +1,50 @@
+# encoding=utf-8
+
+import os
+import sys
+from unittest import TestCase
+
+from reader.generate import load_reader, reader_digest
+from reader.generic import GeneralReader
+
+
+class LoadReaderTest(TestCase):
+    def test_load_reader(self):
+        reader_cls = load_reader('systemd', '%d %h %s: %m')
+        self.assertTrue(issubclass(reader_cls, GeneralReader))
+        self.assertIs(reader_cls, load_reader('systemd', '%d %h %s: %m'))
+        self.assertTrue(os.path.exists(
+            sys.modules[reader_cls.__module__].__file__))
+        records = reader_cls(['Jan 01 00:00:01 arch kernel: hello\n'])\
+            .readall()
+        self.assertEqual('hello', records[0].message)
+        path = sys.modules[reader_cls.__module__].__file__
+        with open(path) as src_file:
+            self.assertIn('$ python {} logfile'.format(os.path.basename(path)),
+                          src_file.read())
+
+    def test_digest(self):
+        self.assertEqual(reader_digest('systemd', '%d %h %s: %m'),
+                         reader_digest('systemd', '%d %h %s: %m'))
+        self.assertNotEqual(reader_digest('systemd', '%d %h %s: %m'),
+                            reader_digest('systemd', '%d %h: %m'))
+
+    def test_projection(self):
+        reader_cls = load_reader('systemd', '%d %h %s: %m')
+        reader = reader_cls(['Jan 01 00:00:01 arch kernel: hello\n'],
+                            keys={'hostname', 'message'})
+        record = reader.readall()[0]
+        self.assertEqual(('hostname', 'message'), record.keys())
+        self.assertEqual('hello', record['message'])
+
+    def test_split(self):
+        reader_cls = load_reader('log4j', '%r [%t] %p %c %x - %m%n')
+        lines = ['1 [main] INFO a.B req_1 - hello\n', '  continued\n',
+                 '2 [main] WARN a.B  - world\n']
+        reader = reader_cls(lines)
+        reader.using_split = True
+        self.assertEqual(reader_cls(lines).readall(), reader.readall())
+        reader = reader_cls(lines, keys={'level'})
+        reader.using_split = True
+        self.assertEqual(['INFO', 'WARN'],
+                         [record.level for record in reader])
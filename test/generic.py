@@ -0,0 +1,434 @@
+# encoding=utf-8
+
+import bz2
+import datetime
+import gzip
+import itertools
+import json
+import lzma
+import os
+import pickle
+import tempfile
+from unittest import TestCase, skipIf
+
+from reader.generate import load_reader
+from reader.generic import GeneralReader, GeneralRecord, LazyRecord
+from reader.generic import import_numpy
+from reader.pattern.systemd import parser
+
+PATTERN = '%d %h %s: %m'
+
+LINES = [
+    'Jan 01 00:00:01 arch kernel: first\n',
+    '  continued\n',
+    'Jan 01 00:00:02 arch systemd[1]: second\n',
+    'Jan 01 00:00:03 arch sshd[42]: third\n',
+]
+
+
+class SampleReader(GeneralReader):
+    def __init__(self, lines):
+        super().__init__(lines)
+        self.regexp, self.triads = parser(PATTERN)
+        self.triads_dict = {key: (cls, arg) for key, cls, arg in self.triads}
+        self.using_named_capture = True
+
+
+class SampleRecord(GeneralRecord):
+    __slots__ = ('datetime', 'hostname', 'source', 'message')
+    KEYS = ('datetime', 'hostname', 'source', 'message')
+
+    def __init__(self, datetime, hostname, source, message):
+        self.datetime = datetime
+        self.hostname = hostname
+        self.source = source
+        self.message = message
+
+
+class IterTest(TestCase):
+    def test_iter(self):
+        records = list(SampleReader(LINES))
+        self.assertEqual(3, len(records))
+        self.assertEqual(['first', 'second', 'third'],
+                         [record['message'] for record in records])
+        self.assertEqual({'pname': 'sshd', 'pid': 42}, records[2]['source'])
+
+    def test_iter_matches_readall(self):
+        self.assertEqual(SampleReader(LINES).readall(),
+                         list(SampleReader(LINES)))
+
+    def test_iter_is_lazy(self):
+        iterator = iter(SampleReader(iter(LINES)))
+        self.assertEqual('first', next(iterator)['message'])
+
+    def test_max_record_size(self):
+        lines = LINES[:1] + ['  more {}\n'.format(i) for i in range(100)]
+        reader = SampleReader(lines)
+        reader.max_record_size = 45
+        records = list(reader._iter_records(lines))
+        self.assertEqual([''.join(lines[:2])], records)
+        self.assertEqual('first', reader.readall()[0]['message'])
+
+    def test_assembler(self):
+        assembler = SampleReader(LINES)._assembler()
+        self.assertIsNone(assembler.feed('orphan\n', 0))
+        records = [assembler.feed(line, offset)
+                   for offset, line in enumerate(LINES)]
+        self.assertEqual([None, None, ''.join(LINES[:2]), LINES[2]], records)
+        self.assertEqual(3, assembler.offset)
+        self.assertEqual(LINES[3], assembler.flush())
+        self.assertIsNone(assembler.flush())
+
+    def test_head_regexp(self):
+        reader = SampleReader(LINES)
+        reader.head_regexp = r'(?:[A-Za-z]{3} \d{2} \d{2}:\d{2}:\d{2})\ '
+        self.assertEqual(SampleReader(LINES).readall(), reader.readall())
+
+    def test_read_batches(self):
+        lines = LINES * 5
+        batches = list(SampleReader(lines).read_batches(4))
+        self.assertEqual([4, 4, 4, 3], [len(batch) for batch in batches])
+        self.assertEqual(SampleReader(lines).readall(),
+                         [record for batch in batches for record in batch])
+        for setup in ('record_cls', 'lazy'):
+            reader = SampleReader(lines)
+            if setup == 'record_cls':
+                reader.record_cls = SampleRecord
+            else:
+                reader.lazy = True
+            records = [record for batch in reader.read_batches(4)
+                       for record in batch]
+            self.assertEqual(SampleReader(lines).readall(), records)
+
+    @skipIf(import_numpy() is None, 'requires numpy')
+    def test_read_batches_columns(self):
+        batches = list(SampleReader(LINES).read_batches(2, columns=True))
+        self.assertEqual(['first', 'second'], list(batches[0]['message']))
+        self.assertEqual(['third'], list(batches[1]['message']))
+
+    @skipIf(import_numpy() is None, 'requires numpy')
+    def test_readall_columns(self):
+        columns = SampleReader(LINES).readall_columns()
+        self.assertEqual('datetime64[us]', str(columns['datetime'].dtype))
+        self.assertEqual(['first', 'second', 'third'],
+                         list(columns['message']))
+
+
+class RecordTest(TestCase):
+    def test_record(self):
+        reader = SampleReader(LINES)
+        reader.record_cls = SampleRecord
+        records = reader.readall()
+        self.assertIsInstance(records[0], SampleRecord)
+        self.assertEqual('second', records[1].message)
+        self.assertEqual('arch', records[1]['hostname'])
+        self.assertEqual(SampleReader(LINES).readall(), records)
+
+    def test_lazy(self):
+        built = []
+        reader = SampleReader(LINES)
+        reader.lazy = True
+        reader._init_builders()
+        builder = reader.lazy_cls.BUILDERS[2]
+        reader.lazy_cls.BUILDERS = reader.lazy_cls.BUILDERS[:2] + (
+            lambda segment: built.append(segment) or builder(segment),
+        ) + reader.lazy_cls.BUILDERS[3:]
+        records = list(reader)
+        self.assertEqual('third', records[2].message)
+        self.assertEqual([], built)
+        self.assertEqual({'pname': 'sshd', 'pid': 42}, records[2]['source'])
+        self.assertEqual({'pname': 'sshd', 'pid': 42}, records[2].source)
+        self.assertEqual(['sshd[42]'], built)
+        self.assertEqual(SampleReader(LINES).readall(), records)
+
+    def test_lazy_later(self):
+        reader = SampleReader(LINES)
+        expected = reader.readall()
+        reader.lazy = True
+        records = list(reader)
+        self.assertIsInstance(records[0], LazyRecord)
+        self.assertEqual(expected, records)
+        reader.record_cls = SampleRecord
+        record = pickle.loads(pickle.dumps(next(iter(reader))))
+        self.assertIsInstance(record, SampleRecord)
+
+    def test_lazy_pickle(self):
+        reader_cls = load_reader('systemd', PATTERN)
+        for make_reader in (SampleReader, reader_cls):
+            expected = list(make_reader(LINES))
+            reader = make_reader(LINES)
+            reader.lazy = True
+            records = pickle.loads(pickle.dumps(list(reader)))
+            self.assertEqual(expected, records)
+            self.assertIs(type(expected[0]), type(records[0]))
+
+
+class StatsTest(TestCase):
+    def test_disabled(self):
+        reader = SampleReader(LINES)
+        reader.readall()
+        self.assertIsNone(reader.stats)
+
+    def test_stats(self):
+        for read in (GeneralReader.readall, list):
+            reader = SampleReader(LINES).enable_stats()
+            self.assertEqual(3, len(read(reader)))
+            stats = reader.stats.as_dict()
+            self.assertEqual(4, stats['read']['calls'])
+            self.assertEqual(3, stats['head']['hits'])
+            self.assertEqual(1, stats['head']['misses'])
+            self.assertEqual(3, stats['match']['hits'])
+            self.assertEqual(0, stats['match']['misses'])
+            self.assertEqual(3, stats['build']['SystemdDate']['calls'])
+            self.assertEqual(3, stats['build']['SystemdSource']['calls'])
+
+
+class CompressTest(TestCase):
+    def test_compressed(self):
+        for opener in (gzip.open, bz2.open, lzma.open):
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                with opener(path, 'wt') as log_file:
+                    log_file.writelines(LINES)
+                reader = SampleReader(path)
+                self.assertIsNotNone(reader.compression)
+                self.assertEqual(SampleReader(LINES).readall(), list(reader))
+            finally:
+                os.remove(path)
+
+
+class FilterTest(TestCase):
+    LINES = [
+        '2014-01-02 03:04:05.000 [main] INFO a.B - started\n',
+        '2014-01-02 03:05:05.000 [main] ERROR a.B - failed\n',
+        '    at a.B.run(B.java:1)\n',
+        '2014-01-02 04:05:05.000 [main] FATAL a.B - died\n',
+        '2014-01-02 04:06:05.000 [main] WARN a.B - ERROR ignored\n',
+    ]
+
+    def setUp(self):
+        self.reader_cls = load_reader('log4j',
+                                      '%d{ISO8601} [%t] %p %c - %m')
+
+    def messages(self, **filters):
+        reader = self.reader_cls(self.LINES).filter(**filters)
+        return [record.message for record in reader]
+
+    def test_levels(self):
+        self.assertEqual(['failed', 'died'],
+                         self.messages(levels={'ERROR', 'FATAL'}))
+
+    def test_time(self):
+        self.assertEqual(
+            ['failed', 'died'],
+            self.messages(since=datetime.datetime(2014, 1, 2, 3, 5),
+                          until=datetime.datetime(2014, 1, 2, 4, 6)))
+
+    def test_contains(self):
+        self.assertEqual(['failed'], self.messages(contains='B.java'))
+
+    def test_mmap(self):
+        fd, path = tempfile.mkstemp(suffix='.log')
+        try:
+            with os.fdopen(fd, 'w') as log_file:
+                log_file.writelines(self.LINES)
+            for filters in ({'contains': 'B.java'}, {'contains': 'WARN'},
+                            {'levels': {'ERROR', 'FATAL'}}):
+                reader = self.reader_cls(path).filter(**filters)
+                reader.using_mmap = True
+                self.assertEqual(self.messages(**filters),
+                                 [record.message for record in reader])
+        finally:
+            os.remove(path)
+
+    def test_projected(self):
+        reader = self.reader_cls(self.LINES, keys={'message'})
+        self.assertRaises(ValueError, reader.filter, levels={'ERROR'})
+
+
+class FileTest(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as log_file:
+            for i in range(500):
+                log_file.write('Jan 01 00:{:02d}:{:02d} arch svc[{}]: msg {}\n'
+                               .format(i // 60 % 60, i % 60, i, i))
+                for j in range(i % 4):
+                    log_file.write('    at frame {}\n'.format(j))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_readall_parallel(self):
+        expected = SampleReader(self.path).readall()
+        for chunks in (1, 7, 64):
+            self.assertEqual(
+                expected,
+                SampleReader(self.path).readall_parallel(2, chunks))
+
+    def test_mmap(self):
+        expected = SampleReader(self.path).readall()
+        reader = SampleReader(self.path)
+        reader.using_mmap = True
+        self.assertEqual(expected, list(reader))
+        self.assertEqual(expected, reader.readall())
+
+    def test_mmap_unmatched(self):
+        with open(self.path, 'a') as log_file:
+            log_file.write('Jan 01 00:09:00 arch broken\n    at frame 0\n')
+        for using_mmap, tolerant in itertools.product((False, True),
+                                                      (False, True)):
+            reader = SampleReader(self.path)
+            reader.head_regexp = r'[A-Za-z]{3} \d{2} '
+            reader.using_mmap = using_mmap
+            reader.tolerant = tolerant
+            if tolerant:
+                self.assertEqual(500, len(reader.readall()))
+            else:
+                with self.assertRaisesRegex(ValueError, ':501: .*broken'):
+                    reader.readall()
+
+
+class YearTest(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as log_file:
+            for i in range(600):
+                day = 'Dec 31' if i < 300 else 'Jan 01'
+                log_file.write('{} {:02d}:{:02d}:00 arch svc[{}]: msg {}\n'
+                               .format(day, i // 60 % 24, i % 60, i, i))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def reader(self):
+        reader = SampleReader(self.path)
+        reader.year = 2015
+        return reader
+
+    def test_passes(self):
+        reader = self.reader()
+        records = reader.readall()
+        self.assertEqual(2015, records[0]['datetime'].year)
+        self.assertEqual(2016, records[-1]['datetime'].year)
+        self.assertEqual(records, list(reader))
+        self.assertEqual(records, list(reader))
+        self.assertEqual(records, self.reader().readall_parallel(2, 8))
+        mmap_reader = self.reader()
+        mmap_reader.using_mmap = True
+        self.assertEqual(records, list(mmap_reader))
+
+    def test_lazy(self):
+        reader = self.reader()
+        reader.lazy = True
+        records = list(reader)
+        self.assertEqual(2016, records[-1].datetime.year)
+        self.assertEqual(2015, records[0].datetime.year)
+
+    def test_filter(self):
+        reader = self.reader().filter(contains='msg 599\n')
+        self.assertEqual([2016], [record['datetime'].year
+                                  for record in reader])
+
+
+class CacheTest(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as log_file:
+            log_file.writelines(LINES * 50)
+        self.cache_path = self.path + '.lpcache'
+
+    def tearDown(self):
+        for path in (self.path, self.cache_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read(self, record_cls=None):
+        reader = SampleReader(self.path).use_cache().enable_stats()
+        reader.record_cls = record_cls
+        return reader.readall(), reader.stats.as_dict()['match']['calls']
+
+    def test_cache(self):
+        expected = SampleReader(self.path).readall()
+        self.assertEqual((expected, 150), self.read())
+        self.assertTrue(os.path.exists(self.cache_path))
+        # only the last record is parsed again
+        self.assertEqual((expected, 1), self.read())
+        records, calls = self.read(SampleRecord)
+        self.assertEqual(expected, records)
+        self.assertIsInstance(records[0], SampleRecord)
+
+    def test_lazy(self):
+        reader = SampleReader(self.path).use_cache()
+        reader.lazy = True
+        for _ in range(2):
+            records = reader.readall()
+            self.assertFalse(any(isinstance(record, LazyRecord)
+                                 for record in records))
+        self.assertEqual(SampleReader(self.path).readall(), records)
+
+    def test_appended(self):
+        self.read()
+        with open(self.path, 'a') as log_file:
+            log_file.write('  continued\n')
+            log_file.writelines(LINES)
+        records, calls = self.read()
+        self.assertEqual(SampleReader(self.path).readall(), records)
+        self.assertEqual(4, calls)
+
+    def test_changed(self):
+        self.read()
+        with open(self.path, 'w') as log_file:
+            log_file.writelines(LINES[2:] * 50)
+        records, calls = self.read()
+        self.assertEqual(SampleReader(self.path).readall(), records)
+        self.assertEqual(100, calls)
+
+
+class FollowTest(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        self.checkpoint = self.path + '.checkpoint'
+
+    def tearDown(self):
+        for path in (self.path, self.checkpoint):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def follow(self):
+        reader = SampleReader(self.path)
+        return [record['message'] for record in
+                reader.follow(self.checkpoint, interval=0.01, timeout=0.02)]
+
+    def test_follow(self):
+        with open(self.path, 'w') as log_file:
+            log_file.writelines(LINES)
+            log_file.write('Jan 01 00:00:04 arch sshd[42]: unfini')
+        self.assertEqual(['first', 'second', 'third'], self.follow())
+        with open(self.path, 'a') as log_file:
+            log_file.write('shed\n')
+            log_file.write('Jan 01 00:00:05 arch sshd[42]: fifth\n')
+        self.assertEqual(['unfinished', 'fifth'], self.follow())
+        self.assertEqual([], self.follow())
+
+    def test_batch_size(self):
+        with open(self.path, 'w') as log_file:
+            log_file.writelines(LINES * 10)
+        records = SampleReader(self.path).follow(
+            self.checkpoint, interval=0.01, timeout=0.02, batch_size=2)
+        self.assertEqual(3, len(list(itertools.islice(records, 3))))
+        # the first batch is saved before the file is read to its end
+        with open(self.checkpoint) as checkpoint_file:
+            self.assertEqual(len(''.join(LINES[:3])),
+                             json.load(checkpoint_file)['offset'])
+        records.close()
+
+    def test_truncate(self):
+        with open(self.path, 'w') as log_file:
+            log_file.writelines(LINES)
+        self.assertEqual(['first', 'second', 'third'], self.follow())
+        with open(self.path, 'w') as log_file:
+            log_file.write(LINES[0])
+        self.assertEqual(['first'], self.follow())
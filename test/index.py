@@ -0,0 +1,72 @@
+# encoding=utf-8
+
+import datetime
+import os
+import tempfile
+from unittest import TestCase
+
+from reader.generate import load_reader
+from reader.index import SparseIndex
+
+PATTERN = '%d{ISO8601} [%t] %p %c - %m'
+START = datetime.datetime(2014, 1, 2)
+
+
+def write_records(log_file, first, last):
+    for i in range(first, last):
+        timestamp = START + datetime.timedelta(seconds=i)
+        log_file.write('{}.000 [main] INFO a.B - record {}\n'
+                       .format(timestamp.strftime('%Y-%m-%d %H:%M:%S'), i))
+        if i % 3 == 0:
+            log_file.write('    at a.B.run(B.java:{})\n'.format(i))
+
+
+class SparseIndexTest(TestCase):
+    def setUp(self):
+        self.reader_cls = load_reader('log4j', PATTERN)
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as log_file:
+            write_records(log_file, 0, 1000)
+
+    def tearDown(self):
+        for path in (self.path, self.path + '.lpidx'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def window(self, since, until):
+        reader = self.reader_cls(self.path).use_index(step=64)
+        reader.filter(since=START + datetime.timedelta(seconds=since),
+                      until=START + datetime.timedelta(seconds=until))
+        return [int(record.message.split()[1]) for record in reader]
+
+    def test_window(self):
+        self.assertEqual(list(range(300, 420)), self.window(300, 420))
+        self.assertEqual(list(range(0, 5)), self.window(-5, 5))
+        index = SparseIndex(self.path, self.reader_cls(self.path)
+                            .pattern_digest(), step=64)
+        index.load()
+        self.assertEqual(16, len(index.offsets))
+        start, end = index.window(START + datetime.timedelta(seconds=300),
+                                  START + datetime.timedelta(seconds=420))
+        self.assertLess(end - start, os.path.getsize(self.path) / 4)
+
+    def test_update(self):
+        self.window(0, 1)
+        with open(self.path, 'a') as log_file:
+            write_records(log_file, 1000, 1100)
+        self.assertEqual(list(range(990, 1100)), self.window(990, 1100))
+        index = SparseIndex(self.path, self.reader_cls(self.path)
+                            .pattern_digest(), step=64)
+        index.load()
+        self.assertEqual(list(range(0, 1100, 64)),
+                         [(timestamp - START).seconds
+                          for timestamp in index.timestamps])
+
+    def test_appended_after_use(self):
+        reader = self.reader_cls(self.path).use_index(step=64)
+        with open(self.path, 'a') as log_file:
+            write_records(log_file, 1000, 1100)
+        reader.filter(since=START + datetime.timedelta(seconds=990))
+        self.assertEqual(110, len(list(reader)))
+        reader.filter(levels={'INFO'})
+        self.assertEqual(1100, len(list(reader)))
@@ -0,0 +1,30 @@
+# encoding=utf-8
+
+from unittest import TestCase
+
+from reader.generate import load_reader
+from reader.merge import merge
+
+SYSTEMD_LINES = [
+    'Jan 02 03:04:00 arch kernel: a\n',
+    'Jan 02 03:04:02 arch sshd[1]: c\n',
+    'Jan 02 03:04:05 arch sshd[1]: f\n',
+]
+LOG4J_LINES = [
+    '2014-01-02 03:04:01.000 [main] INFO a.B - b\n',
+    '2014-01-02 03:04:03.000 [main] ERROR a.B - d\n',
+    '    at a.B.run(B.java:1)\n',
+    '2014-01-02 03:04:04.000 [main] INFO a.B - e\n',
+]
+
+
+class MergeTest(TestCase):
+    def test_merge(self):
+        systemd = load_reader('systemd', '%d %h %s: %m')(SYSTEMD_LINES)
+        systemd.year = 2014
+        log4j = load_reader('log4j', '%d{ISO8601} [%t] %p %c - %m')(
+            LOG4J_LINES)
+        merged = list(merge(systemd, log4j, with_source=True))
+        self.assertEqual(['a', 'b', 'c', 'd', 'e', 'f'],
+                         [record['message'] for _, record in merged])
+        self.assertEqual([0, 1, 0, 1, 1, 0], [index for index, _ in merged])
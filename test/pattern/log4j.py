@@ -1,9 +1,15 @@
 # encoding=utf-8
 
+import datetime
+import re
 from unittest import TestCase, TestSuite, TextTestRunner
 
-from reader.pattern.common import gen_pattern_parser
+from reader.pattern.common import compile_splitter, gen_pattern_parser
 from reader.pattern.log4j import Log4jDate
+from reader.pattern.log4j import SIMPLE_CONVERSION_PATTERN
+from reader.pattern.log4j import TTCC_CONVERSION_PATTERN
+from reader.pattern.log4j import parser as full_parser
+from reader.pattern.log4j import split_parser
 from reader.pattern.log4j import test_parser as parser
 
 
@@ -16,6 +22,42 @@ class ParserTest(TestCase):
     def test_build(self):
         pass
 
+    def test_builtin_patterns(self):
+        for pattern, line in [
+                (SIMPLE_CONVERSION_PATTERN,
+                 '2014-01-02 03:04:05,678 [main] INFO com.a.B - hello\n'),
+                (TTCC_CONVERSION_PATTERN,
+                 '123 [main] INFO com.a.B req_42 - hello\n')]:
+            regexp, triads = full_parser(pattern)
+            self.assertTrue(re.match(regexp, line), pattern)
+
+
+class SplitParserTest(TestCase):
+    def test_split_as_regexp(self):
+        regexp, triads = full_parser(TTCC_CONVERSION_PATTERN)
+        split = compile_splitter(split_parser(TTCC_CONVERSION_PATTERN))
+        for line in ['123 [main] INFO com.a.B  - hello\n',
+                     '123 [main] INFO com.a.B req_42 - a - b\n\tat x\n',
+                     '123 [main] INFO com.a.B req_42 - \n']:
+            self.assertEqual(list(re.match(regexp, line).groups()),
+                             split(line))
+
+    def test_fallback(self):
+        split = compile_splitter(split_parser(TTCC_CONVERSION_PATTERN))
+        for line in ['123 [main] TRACE com.a.B  - hello\n',
+                     'x23 [main] INFO com.a.B  - hello\n',
+                     '123 [main] INFO com.a.B\n']:
+            self.assertIsNone(split(line))
+
+    def test_projection(self):
+        split = compile_splitter(split_parser(SIMPLE_CONVERSION_PATTERN,
+                                              keys={'level'}))
+        self.assertEqual(['WARN'], split(
+            '2014-01-02 03:04:05,678 [main] WARN com.a.B - hello\n'))
+
+    def test_unsplittable(self):
+        self.assertIsNone(split_parser('%m [%t]'))
+
 
 class DirectiveTestDate(TestCase):
     def test_regexp(self):
@@ -27,7 +69,15 @@ class DirectiveTestDate(TestCase):
                          Log4jDate.time_format('', 'yyyy/MM/dd HH:mm:ss,SSS'))
 
     def test_strptime(self):
-        pass
+        for segment, format_str in [
+                ('2014-01-02 03:04:05.678', '%Y-%m-%d %H:%M:%S.%f'),
+                ('2014-1-02 03:04:05.678', '%Y-%m-%d %H:%M:%S.%f'),
+                ('03:04:05.008', '%H:%M:%S.%f'),
+                ('12 Feb 2014 03:04:05.678', '%d %b %Y %H:%M:%S.%f'),
+                ('2014/01/02 03:04:05,678', '%Y/%m/%d %H:%M:%S,%f')]:
+            self.assertEqual(
+                datetime.datetime.strptime(segment, format_str),
+                Log4jDate.build(segment, format_str))
 
 
 def main():
@@ -35,6 +85,7 @@ def main():
     suite.addTest(ParserTest("test_parser"))
     suite.addTest(DirectiveTestDate("test_regexp"))
     suite.addTest(DirectiveTestDate("test_format"))
+    suite.addTest(DirectiveTestDate("test_strptime"))
     runner = TextTestRunner()
     runner.run(suite)
 
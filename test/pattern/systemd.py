@@ -1,6 +1,12 @@
 # encoding=utf-8
 
+import calendar
+import datetime
 from unittest import TestCase
+
+from reader.generic import GeneralReader
+from reader.pattern.systemd import SystemdDate
+from reader.pattern.systemd import parser as full_parser
 from reader.pattern.systemd import test_parser as parser
 
 
@@ -9,3 +15,51 @@ class ParserTest(TestCase):
         self.assertEqual(
             r'([A-Za-z]{3} \d{2} \d{2}:\d{2}:\d{2})\ (\w+)\ ([\w\[\]]+)\:\ (.*)',
             parser('%d %h %s: %m'))
+
+    def test_projection(self):
+        regexp, triads = full_parser('%d %h %s: %m', keys={'hostname'})
+        self.assertEqual(
+            r'(?:[A-Za-z]{3} \d{2} \d{2}:\d{2}:\d{2})\ (?P<hostname>\w+)\ '
+            r'(?:[\.\-\w\[\]]+):\ ',
+            regexp)
+        self.assertEqual(['hostname'], [key for key, _, _ in triads])
+
+    def test_memoized(self):
+        full_parser.cache_clear()
+        regexp, triads = full_parser('%d %h %s: %m')
+        # the cached triads are not shared with the callers
+        triads.clear()
+        self.assertEqual(4, len(full_parser('%d %h %s: %m')[1]))
+        self.assertEqual(1, full_parser.cache_info().hits)
+
+
+class DirectiveTestDate(TestCase):
+    def test_rollover(self):
+        reader = GeneralReader([])
+        reader.year = 2015
+        stamp = SystemdDate.stamper(reader, '%b %d %H:%M:%S')
+        build = SystemdDate.builder(reader, '%b %d %H:%M:%S')
+        segments = [stamp(segment) for segment in
+                    ('Dec 31 23:59:58', 'Dec 31 23:59:59', 'Jan 01 00:00:01')]
+        self.assertEqual(datetime.datetime(2016, 1, 1, 0, 0, 1),
+                         build(segments[2]))
+        self.assertEqual(datetime.datetime(2015, 12, 31, 23, 59, 58),
+                         build(segments[0]))
+        self.assertEqual(datetime.datetime(2015, 12, 31, 23, 59, 59),
+                         build(segments[1]))
+        self.assertIsNone(SystemdDate.stamper(GeneralReader([]),
+                                              '%b %d %H:%M:%S'))
+
+    def test_infer_year(self):
+        now = datetime.datetime.now()
+        build = SystemdDate.builder(GeneralReader([]), '%b %d %H:%M:%S')
+        self.assertEqual(now.year, build(now.strftime('%b %d %H:%M:%S')).year)
+        future = now + datetime.timedelta(days=3)
+        if future.year == now.year:
+            self.assertEqual(
+                now.year - 1,
+                build(future.strftime('%b %d %H:%M:%S')).year)
+
+    def test_leap_day(self):
+        build = SystemdDate.builder(GeneralReader([]), '%b %d %H:%M:%S')
+        self.assertTrue(calendar.isleap(build('Feb 29 12:00:00').year))
@@ -0,0 +1,60 @@
+# encoding=utf-8
+
+import pickle
+from unittest import TestCase
+
+from reader.generate import load_reader
+from reader.sketch import CountMinSketch, HyperLogLog, sketch
+
+
+class HyperLogLogTest(TestCase):
+    def test_count(self):
+        hll = HyperLogLog()
+        self.assertEqual(0, hll.count())
+        hll.update('thread-{}'.format(i % 50) for i in range(1000))
+        self.assertEqual(50, hll.count())
+        hll.update(range(100000))
+        self.assertAlmostEqual(100050, hll.count(), delta=100050 * 0.05)
+
+    def test_merge(self):
+        left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        left.update(range(0, 6000))
+        right.update(range(4000, 10000))
+        union.update(range(0, 10000))
+        # as sent back by a worker
+        right = pickle.loads(pickle.dumps(right))
+        self.assertEqual(union.registers, left.merge(right).registers)
+        with self.assertRaises(ValueError):
+            left.merge(HyperLogLog(10))
+
+
+class CountMinSketchTest(TestCase):
+    def test_top(self):
+        cms = CountMinSketch(width=256, k=3)
+        for i in range(2000):
+            cms.add('rare-{}'.format(i))
+        cms.update(['a.Hot'] * 500 + ['a.Warm'] * 300 + ['a.Mild'] * 100)
+        self.assertEqual(['a.Hot', 'a.Warm', 'a.Mild'],
+                         [value for value, _ in cms.top()])
+        self.assertGreaterEqual(cms.estimate('a.Warm'), 300)
+        self.assertEqual(2900, cms.total)
+
+    def test_merge(self):
+        left, right = CountMinSketch(k=2), CountMinSketch(k=2)
+        left.update(['a'] * 5 + ['b'] * 4 + ['c'] * 3)
+        right.update(['c'] * 3 + ['d'])
+        left.merge(right)
+        self.assertEqual([('c', 6), ('a', 5)], left.top())
+        with self.assertRaises(ValueError):
+            left.merge(CountMinSketch(width=16))
+
+
+class SketchTest(TestCase):
+    def test_sketch(self):
+        lines = ['Jan 02 03:04:0{} {} sshd[{}]: hi\n'.format(i, host, i)
+                 for i, host in enumerate(['arch', 'node', 'arch', 'arch'])]
+        reader = load_reader('systemd', '%d %h %s: %m')(lines)
+        sketches = sketch(reader, {'hostname': HyperLogLog(),
+                                   'source.pname': CountMinSketch(k=1)})
+        self.assertEqual(2, sketches['hostname'].count())
+        self.assertEqual([('sshd', 4)], sketches['source.pname'].top())